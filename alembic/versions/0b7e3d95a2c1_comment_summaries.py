@@ -0,0 +1,41 @@
+"""comment summaries
+
+Revision ID: 0b7e3d95a2c1
+Revises: f18b6e0d4c93
+Create Date: 2026-10-18 19:05:12.874130
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b7e3d95a2c1'
+down_revision: Union[str, Sequence[str], None] = 'f18b6e0d4c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by Base.metadata.create_all on a fresh database
+    if not sa.inspect(op.get_bind()).has_table("products"):
+        return
+
+    # Filled in on the first ai_analysis request of each product
+    op.create_table(
+        "comment_summaries",
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True, nullable=False),
+        sa.Column("summary", sa.String(), nullable=False),
+        sa.Column("last_comment_id", sa.Integer(), nullable=False),
+        sa.Column("comment_count", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("NOW()"), nullable=False),
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("comment_summaries", if_exists=True)
@@ -0,0 +1,34 @@
+"""embedding projection activation
+
+Revision ID: 2e9c7b4d1f68
+Revises: 3d8b6f2a9e51
+Create Date: 2026-10-18 21:34:09.662714
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2e9c7b4d1f68'
+down_revision: Union[str, Sequence[str], None] = '3d8b6f2a9e51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by Base.metadata.create_all on a fresh database
+    if not sa.inspect(op.get_bind()).has_table("embedding_projections"):
+        return
+
+    op.execute("ALTER TABLE embedding_projections ADD COLUMN IF NOT EXISTS activated_at TIMESTAMP WITH TIME ZONE")
+    # Until now the latest fitted version was the active one
+    op.execute("UPDATE embedding_projections SET activated_at = created_at WHERE activated_at IS NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE embedding_projections DROP COLUMN IF EXISTS activated_at")
@@ -0,0 +1,32 @@
+"""comment summary generation
+
+Revision ID: 3d8b6f2a9e51
+Revises: 6c4f1a8e2d70
+Create Date: 2026-10-18 21:02:48.315907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d8b6f2a9e51'
+down_revision: Union[str, Sequence[str], None] = '6c4f1a8e2d70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by Base.metadata.create_all on a fresh database
+    if not sa.inspect(op.get_bind()).has_table("comment_summaries"):
+        return
+
+    op.execute("ALTER TABLE comment_summaries ADD COLUMN IF NOT EXISTS generation INTEGER NOT NULL DEFAULT 0")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE comment_summaries DROP COLUMN IF EXISTS generation")
@@ -0,0 +1,33 @@
+"""product embedding hash
+
+Revision ID: 5f0b7d2e9a14
+Revises: d3a9f5c27e60
+Create Date: 2026-10-18 13:05:41.220518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f0b7d2e9a14'
+down_revision: Union[str, Sequence[str], None] = 'd3a9f5c27e60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by Base.metadata.create_all on a fresh database
+    if not sa.inspect(op.get_bind()).has_table("products"):
+        return
+
+    # Existing rows stay NULL, POST /admin/reembed (or python -m app.reembed) fills them in
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS embedding_hash VARCHAR(64)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS embedding_hash")
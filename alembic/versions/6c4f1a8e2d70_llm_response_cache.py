@@ -0,0 +1,42 @@
+"""llm response cache
+
+Revision ID: 6c4f1a8e2d70
+Revises: 0b7e3d95a2c1
+Create Date: 2026-10-18 20:11:37.602948
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c4f1a8e2d70'
+down_revision: Union[str, Sequence[str], None] = '0b7e3d95a2c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by Base.metadata.create_all on a fresh database
+    if not sa.inspect(op.get_bind()).has_table("products"):
+        return
+
+    op.create_table(
+        "llm_response_cache",
+        sa.Column("model", sa.String(), primary_key=True, nullable=False),
+        sa.Column("prompt_hash", sa.String(length=64), primary_key=True, nullable=False),
+        sa.Column("response", sa.String(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("NOW()"), nullable=False),
+        sa.Column("expires_at", sa.TIMESTAMP(timezone=True), nullable=False),
+        if_not_exists=True
+    )
+    op.create_index("ix_llm_response_cache_created_at", "llm_response_cache", ["created_at"], if_not_exists=True)
+    op.create_index("ix_llm_response_cache_expires_at", "llm_response_cache", ["expires_at"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("llm_response_cache", if_exists=True)
@@ -0,0 +1,36 @@
+"""product keyset pagination indexes
+
+Revision ID: 7c1e2f9a4b3d
+Revises: 42566c837a8d
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e2f9a4b3d'
+down_revision: Union[str, Sequence[str], None] = '42566c837a8d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by Base.metadata.create_all on a fresh database
+    if not sa.inspect(op.get_bind()).has_table("products"):
+        return
+
+    op.create_index("ix_products_price_id", "products", ["price", "id"], if_not_exists=True)
+    op.create_index("ix_products_rating_id", "products", ["rating", "id"], if_not_exists=True)
+    op.create_index("ix_products_created_at_id", "products", ["created_at", "id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_products_created_at_id", table_name="products", if_exists=True)
+    op.drop_index("ix_products_rating_id", table_name="products", if_exists=True)
+    op.drop_index("ix_products_price_id", table_name="products", if_exists=True)
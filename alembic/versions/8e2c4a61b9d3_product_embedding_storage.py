@@ -0,0 +1,49 @@
+"""product embedding storage
+
+Revision ID: 8e2c4a61b9d3
+Revises: 5f0b7d2e9a14
+Create Date: 2026-10-18 13:48:12.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2c4a61b9d3'
+down_revision: Union[str, Sequence[str], None] = '5f0b7d2e9a14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by Base.metadata.create_all on a fresh database
+    if not sa.inspect(op.get_bind()).has_table("products"):
+        return
+
+    # The schema does not depend on EMBEDDING_STORAGE: only the float32 index is
+    # created here, `python -m app.embedding_storage` switches to another storage.
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_embedding_hnsw
+            ON products USING hnsw (embedding vector_cosine_ops)
+            WITH (m = 16, ef_construction = 64)
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if not sa.inspect(op.get_bind()).has_table("products"):
+        return
+
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_embedding_hnsw
+            ON products USING hnsw (embedding vector_cosine_ops)
+            WITH (m = 16, ef_construction = 64)
+        """)
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_products_embedding_halfvec_hnsw")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_products_embedding_binary_hnsw")
@@ -0,0 +1,48 @@
+"""comment sentiment queue
+
+Revision ID: a5d2c8e71f46
+Revises: e47a9b3c5d18
+Create Date: 2026-10-18 17:04:26.318592
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a5d2c8e71f46'
+down_revision: Union[str, Sequence[str], None] = 'e47a9b3c5d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by Base.metadata.create_all on a fresh database
+    if not sa.inspect(op.get_bind()).has_table("comments"):
+        return
+
+    op.execute("ALTER TABLE comments ALTER COLUMN sentiment_score DROP NOT NULL")
+    op.execute("ALTER TABLE comments ALTER COLUMN sentiment_label DROP NOT NULL")
+    # Existing comments were classified inline, only new ones start out pending
+    op.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS sentiment_status VARCHAR NOT NULL DEFAULT 'done'")
+    op.execute("ALTER TABLE comments ALTER COLUMN sentiment_status SET DEFAULT 'pending'")
+    op.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS sentiment_attempts INTEGER NOT NULL DEFAULT 0")
+    op.create_index(
+        "ix_comments_sentiment_queue", "comments", ["sentiment_status", "id"],
+        postgresql_where=sa.text("sentiment_status IN ('pending', 'failed')"),
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_comments_sentiment_queue", table_name="comments", if_exists=True)
+    op.execute("ALTER TABLE comments DROP COLUMN IF EXISTS sentiment_attempts")
+    op.execute("ALTER TABLE comments DROP COLUMN IF EXISTS sentiment_status")
+    # Comments that were never classified count as neutral
+    op.execute("UPDATE comments SET sentiment_score = 0, sentiment_label = 'neutral' WHERE sentiment_label IS NULL")
+    op.execute("ALTER TABLE comments ALTER COLUMN sentiment_label SET NOT NULL")
+    op.execute("ALTER TABLE comments ALTER COLUMN sentiment_score SET NOT NULL")
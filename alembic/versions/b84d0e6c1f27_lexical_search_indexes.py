@@ -0,0 +1,62 @@
+"""lexical search indexes
+
+Revision ID: b84d0e6c1f27
+Revises: 7c1e2f9a4b3d
+Create Date: 2026-10-18 11:02:17.540913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b84d0e6c1f27'
+down_revision: Union[str, Sequence[str], None] = '7c1e2f9a4b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    inspector = sa.inspect(op.get_bind())
+
+    if inspector.has_table("products"):
+        op.execute("""
+            ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(brand, '') || ' ' || coalesce(description, ''))
+            ) STORED
+        """)
+        op.create_index(
+            "ix_products_title_trgm", "products", ["title"],
+            postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}, if_not_exists=True
+        )
+        op.create_index(
+            "ix_products_search_vector", "products", ["search_vector"],
+            postgresql_using="gin", if_not_exists=True
+        )
+
+    if inspector.has_table("users"):
+        op.create_index(
+            "ix_users_username_trgm", "users", ["username"],
+            postgresql_using="gin", postgresql_ops={"username": "gin_trgm_ops"}, if_not_exists=True
+        )
+
+    if inspector.has_table("categories"):
+        op.create_index(
+            "ix_categories_name_trgm", "categories", ["name"],
+            postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_categories_name_trgm", table_name="categories", if_exists=True)
+    op.drop_index("ix_users_username_trgm", table_name="users", if_exists=True)
+    op.drop_index("ix_products_search_vector", table_name="products", if_exists=True)
+    op.drop_index("ix_products_title_trgm", table_name="products", if_exists=True)
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS search_vector")
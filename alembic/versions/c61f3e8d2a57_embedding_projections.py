@@ -0,0 +1,48 @@
+"""embedding projections
+
+Revision ID: c61f3e8d2a57
+Revises: 8e2c4a61b9d3
+Create Date: 2026-10-18 14:31:27.558930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c61f3e8d2a57'
+down_revision: Union[str, Sequence[str], None] = '8e2c4a61b9d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by Base.metadata.create_all on a fresh database
+    if not sa.inspect(op.get_bind()).has_table("products"):
+        return
+
+    op.create_table(
+        "embedding_projections",
+        sa.Column("version", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column("dim", sa.Integer(), nullable=False),
+        sa.Column("components", sa.LargeBinary(), nullable=False),
+        sa.Column("mean", sa.LargeBinary(), nullable=False),
+        sa.Column("explained_variance", sa.Float(), nullable=False),
+        sa.Column("sample_size", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("NOW()"), nullable=False),
+        if_not_exists=True
+    )
+    # Filled in by python -m app.reduction fit, which also builds the HNSW index on them
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS embedding_reduced vector")
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS embedding_reduced_version INTEGER")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_products_embedding_pca_hnsw")
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS embedding_reduced_version")
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS embedding_reduced")
+    op.drop_table("embedding_projections", if_exists=True)
@@ -0,0 +1,38 @@
+"""product embedding hnsw index
+
+Revision ID: d3a9f5c27e60
+Revises: b84d0e6c1f27
+Create Date: 2026-10-18 12:20:05.913377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a9f5c27e60'
+down_revision: Union[str, Sequence[str], None] = 'b84d0e6c1f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by Base.metadata.create_all on a fresh database
+    if not sa.inspect(op.get_bind()).has_table("products"):
+        return
+
+    # HNSW requires pgvector >= 0.5.0. Built concurrently so the catalog stays writable.
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_embedding_hnsw
+            ON products USING hnsw (embedding vector_cosine_ops)
+            WITH (m = 16, ef_construction = 64)
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_products_embedding_hnsw", table_name="products", if_exists=True)
@@ -0,0 +1,41 @@
+"""product neighbours
+
+Revision ID: e47a9b3c5d18
+Revises: c61f3e8d2a57
+Create Date: 2026-10-18 15:12:53.071446
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e47a9b3c5d18'
+down_revision: Union[str, Sequence[str], None] = 'c61f3e8d2a57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by Base.metadata.create_all on a fresh database
+    if not sa.inspect(op.get_bind()).has_table("products"):
+        return
+
+    # Filled in by POST /admin/neighbours or python -m app.neighbours
+    op.create_table(
+        "product_neighbours",
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True, nullable=False),
+        sa.Column("neighbour_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True, nullable=False),
+        sa.Column("score", sa.Float(), nullable=False),
+        if_not_exists=True
+    )
+    op.create_index("ix_product_neighbours_product_id_score", "product_neighbours", ["product_id", "score"], if_not_exists=True)
+    op.create_index("ix_product_neighbours_neighbour_id", "product_neighbours", ["neighbour_id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("product_neighbours", if_exists=True)
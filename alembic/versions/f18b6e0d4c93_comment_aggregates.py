@@ -0,0 +1,67 @@
+"""comment aggregates
+
+Revision ID: f18b6e0d4c93
+Revises: a5d2c8e71f46
+Create Date: 2026-10-18 18:22:40.519307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f18b6e0d4c93'
+down_revision: Union[str, Sequence[str], None] = 'a5d2c8e71f46'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by Base.metadata.create_all on a fresh database
+    if not sa.inspect(op.get_bind()).has_table("comments"):
+        return
+
+    op.create_table(
+        "comment_aggregates",
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True, nullable=False),
+        sa.Column("comment_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("rating_sum", sa.Float(), server_default="0", nullable=False),
+        sa.Column("classified_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("sentiment_score_sum", sa.Float(), server_default="0", nullable=False),
+        sa.Column("label_counts", postgresql.JSONB(), server_default=sa.text("'{}'::jsonb"), nullable=False),
+        if_not_exists=True
+    )
+
+    # Backfill, the same as python -m app.comment_aggregates
+    op.execute("DELETE FROM comment_aggregates")
+    op.execute("""
+        INSERT INTO comment_aggregates (product_id, comment_count, rating_sum, classified_count, sentiment_score_sum, label_counts)
+        SELECT
+            comments.product_id,
+            count(*),
+            sum(comments.rating),
+            count(*) FILTER (WHERE comments.sentiment_status = 'done'),
+            COALESCE(sum(comments.sentiment_score) FILTER (WHERE comments.sentiment_status = 'done'), 0),
+            COALESCE(labels.label_counts, '{}'::jsonb)
+        FROM comments
+        LEFT JOIN (
+            SELECT product_id, jsonb_object_agg(sentiment_label, label_count) AS label_counts
+            FROM (
+                SELECT product_id, sentiment_label, count(*) AS label_count
+                FROM comments
+                WHERE sentiment_status = 'done'
+                GROUP BY product_id, sentiment_label
+            ) AS counted
+            GROUP BY product_id
+        ) AS labels ON labels.product_id = comments.product_id
+        GROUP BY comments.product_id, labels.label_counts
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("comment_aggregates", if_exists=True)
@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+
+class MicroBatcher:
+    """
+    Collect concurrent single-item calls into batches for one vectorized call.
+
+    Callers block on `__call__` (or keep the Future from `submit`). A daemon
+    worker thread takes the first waiting item, keeps collecting for at most
+    `max_wait_ms` or until `max_batch_size` items are queued, then runs
+    `batch_fn` once and hands every caller its own result. An idle caller
+    pays at most `max_wait_ms` extra latency. When a batch fails, its items
+    are run one by one, so only the callers whose own input fails get the
+    exception.
+
+    Args:
+        batch_fn (Callable): Maps a list of inputs to a list of outputs of the same length and order.
+        max_batch_size (int): Upper bound of items per `batch_fn` call.
+        max_wait_ms (float): How long the first item of a batch waits for company.
+        name (str): Worker thread name.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 32, max_wait_ms: float = 5, name: str = "micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, item: Any) -> Future:
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize()
+        }
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _call(self, items: list) -> list:
+        results = self.batch_fn(items)
+        if len(results) != len(items):
+            raise ValueError(f"{self.name}: batch_fn returned {len(results)} results for {len(items)} items")
+        return results
+
+    def _run(self):
+        while True:
+            # Callers that cancelled their Future meanwhile are dropped
+            batch = [(item, future) for item, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+
+            try:
+                results = self._call(items)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                # One bad input must not fail its neighbours, run every item on its own
+                self._run_each(batch)
+                continue
+
+            self.batches += 1
+            self.items += len(items)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _run_each(self, batch: list):
+        for item, future in batch:
+            try:
+                result = self._call([item])[0]
+            except Exception as e:
+                future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += 1
+            future.set_result(result)
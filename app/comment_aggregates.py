@@ -0,0 +1,144 @@
+"""
+Per-product comment totals behind GET /products/{product_id}/ai_analysis.
+
+    python -m app.comment_aggregates
+
+Every comment write adjusts its product's row in the same transaction, so
+the totals are exact without reading the comments. The command rebuilds
+the whole table from the comments, for rows changed outside the API.
+"""
+import argparse
+from collections import defaultdict
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Comment, CommentAggregate
+
+# Labels are counted in a JSONB object, the label of a delta adds `classified` to its key
+APPLY_DELTA = text("""
+    INSERT INTO comment_aggregates AS aggregates (product_id, comment_count, rating_sum, classified_count, sentiment_score_sum, label_counts)
+    VALUES (
+        :product_id, :comments, :rating, :classified, :score,
+        CASE WHEN CAST(:label AS text) IS NULL THEN '{}'::jsonb ELSE jsonb_build_object(CAST(:label AS text), :classified) END
+    )
+    ON CONFLICT (product_id) DO UPDATE SET
+        comment_count = aggregates.comment_count + EXCLUDED.comment_count,
+        rating_sum = aggregates.rating_sum + EXCLUDED.rating_sum,
+        classified_count = aggregates.classified_count + EXCLUDED.classified_count,
+        sentiment_score_sum = aggregates.sentiment_score_sum + EXCLUDED.sentiment_score_sum,
+        label_counts = CASE
+            WHEN CAST(:label AS text) IS NULL THEN aggregates.label_counts
+            ELSE aggregates.label_counts || jsonb_build_object(
+                CAST(:label AS text),
+                COALESCE(CAST(aggregates.label_counts ->> CAST(:label AS text) AS integer), 0) + :classified
+            )
+        END
+""")
+
+REBUILD = text("""
+    INSERT INTO comment_aggregates (product_id, comment_count, rating_sum, classified_count, sentiment_score_sum, label_counts)
+    SELECT
+        comments.product_id,
+        count(*),
+        sum(comments.rating),
+        count(*) FILTER (WHERE comments.sentiment_status = 'done'),
+        COALESCE(sum(comments.sentiment_score) FILTER (WHERE comments.sentiment_status = 'done'), 0),
+        COALESCE(labels.label_counts, '{}'::jsonb)
+    FROM comments
+    LEFT JOIN (
+        SELECT product_id, jsonb_object_agg(sentiment_label, label_count) AS label_counts
+        FROM (
+            SELECT product_id, sentiment_label, count(*) AS label_count
+            FROM comments
+            WHERE sentiment_status = 'done'
+            GROUP BY product_id, sentiment_label
+        ) AS counted
+        GROUP BY product_id
+    ) AS labels ON labels.product_id = comments.product_id
+    GROUP BY comments.product_id, labels.label_counts
+""")
+
+
+def apply_delta(
+    db: Session,
+    product_id: int,
+    comments: int = 0,
+    rating: float = 0.0,
+    label: Optional[str] = None,
+    classified: int = 0,
+    score: float = 0.0
+):
+    """
+    Add to a product's totals, negative values subtract. Committed with the caller's transaction.
+    """
+    db.execute(APPLY_DELTA, {
+        "product_id": product_id,
+        "comments": comments,
+        "rating": rating,
+        "label": label,
+        "classified": classified,
+        "score": score
+    })
+
+
+def add_comment(db: Session, comment: Comment):
+    apply_delta(db, comment.product_id, comments=1, rating=comment.rating)
+
+
+def remove_comment(db: Session, comment: Comment):
+    apply_delta(db, comment.product_id, comments=-1, rating=-comment.rating)
+    remove_sentiment(db, comment)
+
+
+def remove_sentiment(db: Session, comment: Comment):
+    """
+    Take back a classified comment's sentiment, before it is re-queued or deleted.
+    """
+    if comment.sentiment_status == "done":
+        apply_delta(db, comment.product_id, label=comment.sentiment_label, classified=-1, score=-comment.sentiment_score)
+
+
+def add_sentiments(db: Session, results: Iterable[Tuple[int, str, float]]):
+    """
+    Count a classified batch of `(product_id, label, score)`, one statement per product and label.
+    """
+    grouped = defaultdict(lambda: [0, 0.0])
+    for product_id, label, score in results:
+        grouped[product_id, label][0] += 1
+        grouped[product_id, label][1] += score
+
+    # Always in (product_id, label) order, so concurrent workers lock the rows in the same order and cannot deadlock
+    for (product_id, label), (classified, score) in sorted(grouped.items()):
+        apply_delta(db, product_id, label=label, classified=classified, score=score)
+
+
+def get_comment_aggregate(db: Session, product_id: int) -> Optional[CommentAggregate]:
+    return db.query(CommentAggregate).\
+        filter(CommentAggregate.product_id == product_id).\
+        first()
+
+
+def rebuild_comment_aggregates(db: Session):
+    """
+    Recompute every product's totals from the comments.
+
+    The table lock makes comment writes wait for the rebuild to commit, so
+    none is counted twice or lost.
+    """
+    db.execute(text("LOCK TABLE comment_aggregates IN EXCLUSIVE MODE"))
+    db.execute(text("DELETE FROM comment_aggregates"))
+    db.execute(REBUILD)
+    db.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the per-product comment aggregates from the comments.")
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rebuild_comment_aggregates(db)
+        print(f"Rebuilt comment aggregates of {db.query(CommentAggregate).count()} products")
+    finally:
+        db.close()
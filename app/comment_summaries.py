@@ -0,0 +1,120 @@
+import os
+from dotenv import load_dotenv
+from sqlalchemy import asc, func, text
+from sqlalchemy.orm import Session
+from app.models import Comment, CommentSummary
+from app.gemini import generate_comment_summary, merge_tree, summarize_chunks
+from app.llm import LLMUnavailable
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
+
+# New comments needed before a stored summary is brought up to date, fewer are left for later
+COMMENT_SUMMARY_MIN_NEW_COMMENTS = int(os.getenv('COMMENT_SUMMARY_MIN_NEW_COMMENTS', '1'))
+
+# Not saved when a comment was edited or deleted since the build read the row (the
+# generation moved on), nor over a newer summary saved by a faster request
+SAVE_SUMMARY = text("""
+    INSERT INTO comment_summaries AS summaries (product_id, summary, last_comment_id, comment_count, generation, updated_at)
+    VALUES (:product_id, :summary, :last_comment_id, :comment_count, :generation, NOW())
+    ON CONFLICT (product_id) DO UPDATE SET
+        summary = EXCLUDED.summary,
+        last_comment_id = EXCLUDED.last_comment_id,
+        comment_count = EXCLUDED.comment_count,
+        updated_at = EXCLUDED.updated_at
+    WHERE summaries.generation = EXCLUDED.generation
+        AND (summaries.last_comment_id, summaries.comment_count) < (EXCLUDED.last_comment_id, EXCLUDED.comment_count)
+""")
+
+# Bumps the generation and empties the summary if it includes the comment. The
+# row is created when missing, so a first build already running is not saved either.
+INVALIDATE_SUMMARY = text("""
+    INSERT INTO comment_summaries AS summaries (product_id, summary, last_comment_id, comment_count, generation, updated_at)
+    VALUES (:product_id, '', 0, 0, 1, NOW())
+    ON CONFLICT (product_id) DO UPDATE SET
+        generation = summaries.generation + 1,
+        summary = CASE WHEN summaries.last_comment_id >= :comment_id THEN '' ELSE summaries.summary END,
+        comment_count = CASE WHEN summaries.last_comment_id >= :comment_id THEN 0 ELSE summaries.comment_count END,
+        last_comment_id = CASE WHEN summaries.last_comment_id >= :comment_id THEN 0 ELSE summaries.last_comment_id END,
+        updated_at = NOW()
+""")
+
+
+def get_comment_summary(db: Session, product_id: int) -> str:
+    """
+    Summary of a product's comments, stored and brought up to date incrementally.
+
+    Only comments past the stored watermark are summarized, in chunks, and
+    merged into the stored summary, so a request costs LLM calls for the
+    new comments only and none when nothing changed. Without a stored
+    summary every comment is summarized. While Gemini is unavailable the
+    stored summary is returned as it is.
+
+    A comment whose transaction commits after a later comment was already
+    summarized ends up below the watermark; the stored comment_count then
+    no longer matches and the summary is rebuilt from every comment.
+
+    Raises:
+        LLMUnavailable: Gemini is unavailable and nothing is stored yet.
+    """
+    stored = db.query(CommentSummary).\
+        filter(CommentSummary.product_id == product_id).\
+        first()
+
+    previous = stored.summary if stored and stored.last_comment_id else None
+    base, watermark, base_count = None, 0, 0
+    if previous is not None:
+        summarized = db.query(func.count(Comment.id)).\
+            filter(Comment.product_id == product_id).\
+            filter(Comment.id <= stored.last_comment_id).\
+            scalar()
+        if summarized == stored.comment_count:
+            base, watermark, base_count = previous, stored.last_comment_id, stored.comment_count
+
+    comments = db.query(Comment.id, Comment.content).\
+        filter(Comment.product_id == product_id).\
+        filter(Comment.id > watermark).\
+        order_by(asc(Comment.id)).\
+        all()
+
+    if not comments or (base is not None and len(comments) < COMMENT_SUMMARY_MIN_NEW_COMMENTS):
+        return base if base is not None else ""
+
+    contents = [comment.content for comment in comments]
+    try:
+        if base is not None:
+            summaries, covered = summarize_chunks(contents)
+            summary = merge_tree([base, *summaries])
+        else:
+            summary, covered = generate_comment_summary(contents)
+    except LLMUnavailable:
+        if previous is None:
+            raise
+        return previous
+
+    # Comments of a chunk that failed, and of the chunks after it, stay past the watermark for the next request
+    comments = comments[:covered]
+
+    db.execute(SAVE_SUMMARY, {
+        "product_id": product_id,
+        "summary": summary,
+        "last_comment_id": comments[-1].id,
+        "comment_count": base_count + len(comments),
+        "generation": stored.generation if stored else 0
+    })
+    db.commit()
+
+    return summary
+
+
+def invalidate_comment_summary(db: Session, product_id: int, comment_id: int):
+    """
+    Empty the stored summary if it includes a comment being edited or deleted, so it is rebuilt,
+    and keep summaries built meanwhile from being saved.
+
+    Committed with the caller's transaction.
+    """
+    db.execute(INVALIDATE_SUMMARY, {
+        "product_id": product_id,
+        "comment_id": comment_id
+    })
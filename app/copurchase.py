@@ -0,0 +1,245 @@
+import os
+import threading
+import numpy as np
+from collections import Counter, defaultdict
+from dotenv import load_dotenv
+from scipy import sparse
+from typing import Iterable, List, Tuple
+from app.database import SessionLocal
+from app.models import CartItem
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
+
+# "Frequently bought together" from the co-occurrence of products in carts,
+# kept in memory by every worker and built from cart_items (or the snapshot)
+# at startup. Off by default, since the build scans every cart item.
+COPURCHASE_ENABLED = os.getenv('COPURCHASE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# Recommendations kept per product, and carts two products must share to be recommended together
+COPURCHASE_K = int(os.getenv('COPURCHASE_K', '50'))
+COPURCHASE_MIN_COUNT = int(os.getenv('COPURCHASE_MIN_COUNT', '1'))
+# Optional .npz file the matrix is loaded from at startup and saved to every
+# COPURCHASE_SNAPSHOT_SECONDS and at shutdown
+COPURCHASE_SNAPSHOT_PATH = os.getenv('COPURCHASE_SNAPSHOT_PATH')
+COPURCHASE_SNAPSHOT_SECONDS = int(os.getenv('COPURCHASE_SNAPSHOT_SECONDS', '300'))
+# Other workers' cart changes are only picked up by a full rebuild, every this many seconds (0 disables)
+COPURCHASE_REFRESH_SECONDS = int(os.getenv('COPURCHASE_REFRESH_SECONDS', '0'))
+
+# Products with pending changes after which the changes are merged into the sparse matrix
+COMPACT_THRESHOLD = 10000
+
+
+class CoPurchaseMatrix:
+    """
+    Symmetric sparse item-item matrix of how many carts contain both products.
+
+    Rows and columns are product ids. Recent cart changes are kept in a small
+    dict of counters and merged into the CSR matrix once enough products
+    changed. Scores are cosine similarities of the products' cart sets,
+    `together / sqrt(carts_i * carts_j)`, so popular products do not show up
+    everywhere. The top COPURCHASE_K of a product are cached until its row
+    changes, so a lookup is a dict access.
+    """
+
+    def __init__(self):
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._reset(sparse.csr_matrix((0, 0), dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    def _reset(self, matrix: sparse.csr_matrix, counts: np.ndarray):
+        self._matrix = matrix
+        self._counts = counts
+        self._delta = defaultdict(Counter)
+        self._delta_counts = Counter()
+        self._top = {}
+
+    def build(self, items: Iterable[Tuple[int, int]]):
+        """
+        Replace the matrix with the co-occurrences of `(cart_id, product_id)` rows.
+
+        With X the binary cart x product incidence matrix, the co-occurrence
+        counts are X.T @ X and its diagonal is the number of carts of each product.
+        """
+        cart_ids, product_ids = [], []
+        for cart_id, product_id in items:
+            cart_ids.append(cart_id)
+            product_ids.append(product_id)
+
+        carts = np.unique(np.asarray(cart_ids, dtype=np.int64), return_inverse=True)[1]
+        size = max(product_ids, default=-1) + 1
+
+        incidence = sparse.csr_matrix(
+            (np.ones(len(carts), dtype=np.int64), (carts, np.asarray(product_ids, dtype=np.int64))),
+            shape=(int(carts.max(initial=-1)) + 1, size)
+        )
+        # The same product twice in a cart counts once
+        incidence.data[:] = 1
+
+        matrix = (incidence.T @ incidence).tocsr()
+        counts = matrix.diagonal().astype(np.int64)
+        matrix.setdiag(0)
+        matrix.eliminate_zeros()
+
+        with self._lock:
+            self._reset(matrix, counts)
+
+    def add_cart(self, product_ids: Iterable[int], sign: int = 1):
+        """
+        Count a cart's products as bought together once more, or once less with `sign=-1`.
+        """
+        product_ids = set(product_ids)
+
+        with self._lock:
+            for product_id in product_ids:
+                self._delta_counts[product_id] += sign
+                row = self._delta[product_id]
+                for other_id in product_ids:
+                    if other_id != product_id:
+                        row[other_id] += sign
+                self._top.pop(product_id, None)
+
+            if len(self._delta) >= COMPACT_THRESHOLD:
+                self._compact()
+
+    def update_cart(self, old_product_ids: Iterable[int], new_product_ids: Iterable[int]):
+        self.add_cart(old_product_ids, sign=-1)
+        self.add_cart(new_product_ids, sign=1)
+
+    def _compact(self):
+        size = max(self._matrix.shape[0], max(self._delta_counts, default=-1) + 1)
+
+        rows, columns, values = [], [], []
+        for product_id, row in self._delta.items():
+            for other_id, value in row.items():
+                rows.append(product_id)
+                columns.append(other_id)
+                values.append(value)
+
+        matrix = self._matrix.copy()
+        matrix.resize((size, size))
+        matrix = matrix + sparse.csr_matrix((values, (rows, columns)), shape=(size, size), dtype=np.int64)
+        matrix.eliminate_zeros()
+
+        counts = np.zeros(size, dtype=np.int64)
+        counts[:len(self._counts)] = self._counts
+        for product_id, value in self._delta_counts.items():
+            counts[product_id] += value
+
+        self._matrix, self._counts = matrix, counts
+        self._delta.clear()
+        self._delta_counts.clear()
+        # Cached scores of rows that did not change still depend on the changed counts
+        self._top.clear()
+
+    # Negative ids would index numpy arrays from the end, i.e. another product's row
+    def _count(self, product_id: int) -> int:
+        base = self._counts[product_id] if 0 <= product_id < len(self._counts) else 0
+        return int(base) + self._delta_counts.get(product_id, 0)
+
+    def _row(self, product_id: int) -> Counter:
+        row = Counter()
+        if 0 <= product_id < self._matrix.shape[0]:
+            start, end = self._matrix.indptr[product_id], self._matrix.indptr[product_id + 1]
+            row.update(dict(zip(self._matrix.indices[start:end].tolist(), self._matrix.data[start:end].tolist())))
+        row.update(self._delta.get(product_id, {}))
+        return row
+
+    def top(self, product_id: int, k: int = COPURCHASE_K) -> List[Tuple[int, float, int]]:
+        """
+        Products most often bought together with `product_id`.
+
+        Returns:
+            List: `(product_id, score, carts together)` tuples, best first.
+        """
+        with self._lock:
+            top = self._top.get(product_id)
+            if top is None:
+                count = self._count(product_id)
+                top = [
+                    (other_id, float(together / np.sqrt(count * self._count(other_id))), together)
+                    for other_id, together in self._row(product_id).items()
+                    if together >= COPURCHASE_MIN_COUNT
+                ]
+                top = sorted(top, key=lambda item: (-item[1], item[0]))[:COPURCHASE_K]
+                self._top[product_id] = top
+            return top[:k]
+
+    def save(self, path: str):
+        """
+        Write the compacted matrix to `path` atomically.
+        """
+        with self._lock:
+            self._compact()
+            matrix, counts = self._matrix, self._counts
+
+        # Per process, workers sharing the path must not write to the same temporary file
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr, shape=matrix.shape, counts=counts)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        with np.load(path) as snapshot:
+            matrix = sparse.csr_matrix((snapshot["data"], snapshot["indices"], snapshot["indptr"]), shape=tuple(snapshot["shape"]))
+            counts = snapshot["counts"]
+
+        with self._lock:
+            self._reset(matrix, counts)
+
+
+copurchase_matrix = CoPurchaseMatrix()
+
+
+def build_copurchase_matrix(batch_size: int = 100000):
+    """
+    Build the matrix from cart_items, streaming the rows in batches.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(CartItem.cart_id, CartItem.product_id).\
+            yield_per(batch_size)
+        copurchase_matrix.build((row.cart_id, row.product_id) for row in rows)
+    finally:
+        db.close()
+
+
+def load_copurchase_matrix():
+    """
+    Start from the snapshot if there is one, otherwise build from cart_items.
+    """
+    if COPURCHASE_SNAPSHOT_PATH and os.path.exists(COPURCHASE_SNAPSHOT_PATH):
+        copurchase_matrix.load(COPURCHASE_SNAPSHOT_PATH)
+    else:
+        build_copurchase_matrix()
+
+
+def save_copurchase_matrix():
+    if COPURCHASE_ENABLED and COPURCHASE_SNAPSHOT_PATH:
+        copurchase_matrix.save(COPURCHASE_SNAPSHOT_PATH)
+
+
+def run_periodically(stop: threading.Event, seconds: float, fn):
+    """
+    Call `fn` every `seconds` until `stop` is set; a failed call is recorded and retried at the next tick.
+    """
+    while not stop.wait(seconds):
+        try:
+            fn()
+        except Exception as e:
+            copurchase_matrix.last_error = f"{type(e).__name__}: {e}"
+            print(f"Co-purchase {fn.__name__} failed: {copurchase_matrix.last_error}")
+
+
+def snapshot_loop(stop: threading.Event):
+    run_periodically(stop, COPURCHASE_SNAPSHOT_SECONDS, save_copurchase_matrix)
+
+
+def refresh_loop(stop: threading.Event):
+    run_periodically(stop, COPURCHASE_REFRESH_SECONDS, build_copurchase_matrix)
+
+
+def record_cart(old_product_ids: Iterable[int] = (), new_product_ids: Iterable[int] = ()):
+    """
+    Apply a committed cart change: creation (no old ids), update, or deletion (no new ids).
+    """
+    if COPURCHASE_ENABLED:
+        copurchase_matrix.update_cart(old_product_ids, new_product_ids)
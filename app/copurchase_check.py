@@ -0,0 +1,83 @@
+"""
+Measure the co-purchase matrix on synthetic carts.
+
+    python -m app.copurchase_check
+    python -m app.copurchase_check --carts 2000000 --products 200000 --items 3
+
+Generates carts whose products follow a Zipf-like popularity, so a few
+products are in many carts, as in real shops, and feeds the resulting
+(cart_id, product_id) rows to CoPurchaseMatrix. Reports the time and memory
+of the build, the latency of add_cart (the slowest calls are the ones that
+merge pending changes into the sparse matrix) and of cold and warm top()
+lookups. Nothing is written to the database.
+"""
+import argparse
+import resource
+import time
+import tracemalloc
+import numpy as np
+from app.copurchase import COMPACT_THRESHOLD, CoPurchaseMatrix
+
+
+def synthetic_carts(carts: int, products: int, items: float, seed: int = 0) -> tuple:
+    """
+    `(cart_ids, product_ids)` arrays of about `carts * items` rows.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = 1 + rng.poisson(items - 1, size=carts)
+    popularity = 1 / np.arange(1, products + 1) ** 0.8
+    product_ids = rng.choice(products, size=int(sizes.sum()), p=popularity / popularity.sum())
+    return np.repeat(np.arange(carts), sizes), product_ids
+
+
+def percentiles(seconds: list) -> str:
+    return f"median {np.median(seconds) * 1e6:.0f} us, p95 {np.percentile(seconds, 95) * 1e6:.0f} us, max {np.max(seconds) * 1e3:.1f} ms"
+
+
+def check(carts: int, products: int, items: float, updates: int, lookups: int):
+    cart_ids, product_ids = synthetic_carts(carts, products, items)
+    print(f"{len(cart_ids)} cart items in {carts} carts over {products} products")
+
+    matrix = CoPurchaseMatrix()
+    tracemalloc.start()
+    started = time.perf_counter()
+    matrix.build(zip(cart_ids.tolist(), product_ids.tolist()))
+    build_seconds = time.perf_counter() - started
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Build: {build_seconds:.2f} s, matrix {size / 2 ** 20:.1f} MiB, peak while building {peak / 2 ** 20:.1f} MiB")
+
+    # New carts drawn like the existing ones, enough to go through at least one compaction
+    new_cart_ids, new_product_ids = synthetic_carts(updates, products, items, seed=1)
+    boundaries = np.flatnonzero(np.diff(new_cart_ids)) + 1
+    add_seconds = []
+    for cart in np.split(new_product_ids, boundaries):
+        started = time.perf_counter()
+        matrix.add_cart(cart.tolist())
+        add_seconds.append(time.perf_counter() - started)
+    print(f"add_cart ({len(add_seconds)} carts, compacting every {COMPACT_THRESHOLD} changed products): {percentiles(add_seconds)}")
+
+    rng = np.random.default_rng(2)
+    sample = rng.choice(product_ids, size=lookups).tolist()
+    for label in ("cold", "warm"):
+        seconds = []
+        for product_id in sample:
+            started = time.perf_counter()
+            matrix.top(product_id)
+            seconds.append(time.perf_counter() - started)
+        print(f"top() {label}: {percentiles(seconds)}")
+
+    # Kilobytes on Linux
+    print(f"Peak process memory: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure build, update and lookup of the co-purchase matrix on synthetic carts.")
+    parser.add_argument("--carts", type=int, default=1000000)
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--items", type=float, default=3, help="Mean products per cart")
+    parser.add_argument("--updates", type=int, default=20000, help="Carts added after the build")
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    check(args.carts, args.products, args.items, args.updates, args.lookups)
@@ -1,9 +1,11 @@
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from typing import Generator
+from typing import Generator, List
 
 dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
 load_dotenv(dotenv_path)
@@ -22,3 +24,24 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+@contextmanager
+def count_queries(bind: Engine = engine) -> Generator[List[str], None, None]:
+    """
+    Record the statements executed on `bind` inside the block, from every thread.
+
+        with count_queries() as statements:
+            ...
+        assert len(statements) == 2
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", record)
@@ -0,0 +1,63 @@
+"""
+Switch the HNSW index of the product embeddings to EMBEDDING_STORAGE.
+
+    python -m app.embedding_storage
+    python -m app.embedding_storage --storage halfvec
+
+Migrations only create the float32 (vector) index, whatever EMBEDDING_STORAGE
+the environment sets. This builds the index of the chosen storage without
+blocking writes and only then drops the other embedding indexes, so search
+keeps an index throughout. Set EMBEDDING_STORAGE to the same value on the
+API workers. halfvec and binary need pgvector >= 0.7, pca needs a projection
+fitted with `python -m app.reduction fit`.
+"""
+import argparse
+from sqlalchemy import text
+from app.database import SessionLocal, engine
+from app.models import EMBEDDING_DIM, EMBEDDING_STORAGE, EMBEDDING_STORAGES
+from app.reduction import create_index as create_pca_index, get_projection
+
+# Index name and indexed expression per storage, matching app.models
+EMBEDDING_INDEXES = {
+    "vector": ("ix_products_embedding_hnsw", "embedding vector_cosine_ops"),
+    "halfvec": ("ix_products_embedding_halfvec_hnsw", f"(CAST(embedding AS halfvec({EMBEDDING_DIM}))) halfvec_cosine_ops"),
+    "binary": ("ix_products_embedding_binary_hnsw", f"(CAST(binary_quantize(embedding) AS bit({EMBEDDING_DIM}))) bit_hamming_ops"),
+    "pca": ("ix_products_embedding_pca_hnsw", None)
+}
+
+
+def switch_storage(storage: str):
+    """
+    Build the HNSW index of `storage`, then drop the embedding indexes of the other storages.
+    """
+    name, expression = EMBEDDING_INDEXES[storage]
+
+    if storage == "pca":
+        db = SessionLocal()
+        try:
+            if get_projection(db) is None:
+                raise SystemExit("No projection activated yet, run: python -m app.reduction fit")
+        finally:
+            db.close()
+        create_pca_index()
+    else:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(f"""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}
+                ON products USING hnsw ({expression})
+                WITH (m = 16, ef_construction = 64)
+            """))
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for other_name, _ in EMBEDDING_INDEXES.values():
+            if other_name != name:
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {other_name}"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the product embedding index of a storage and drop the others.")
+    parser.add_argument("--storage", choices=EMBEDDING_STORAGES, default=EMBEDDING_STORAGE)
+    args = parser.parse_args()
+
+    switch_storage(args.storage)
+    print(f"Product embeddings are indexed for EMBEDDING_STORAGE={args.storage}")
@@ -1,22 +1,48 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from app.schemas.products import ProductBase
-import google.generativeai as genai
-from typing import List
+from app.llm import llm_client
+from typing import Callable, List, Tuple
 
 dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
 load_dotenv(dotenv_path)
 
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+# Deadline of a search query refinement, search goes on with the raw query after it
+QUERY_REFINE_DEADLINE_SECONDS = float(os.getenv('QUERY_REFINE_DEADLINE_SECONDS', '5'))
+# Comment summarization: concurrent chunk summaries and merges per process, and
+# summaries combined by one merge prompt
+GEMINI_SUMMARY_CONCURRENCY = int(os.getenv('GEMINI_SUMMARY_CONCURRENCY', '8'))
+GEMINI_MERGE_FANIN = int(os.getenv('GEMINI_MERGE_FANIN', '8'))
+# Comments per summarize_chunk prompt
+COMMENT_CHUNK_SIZE = 50
 
-genai.configure(api_key=GEMINI_API_KEY)
+if GEMINI_MERGE_FANIN < 2:
+    raise ValueError(f"GEMINI_MERGE_FANIN must be at least 2, got {GEMINI_MERGE_FANIN}")
 
-model = genai.GenerativeModel("gemini-2.5-pro")
+_executor = None
+_executor_lock = threading.Lock()
 
 
-def generate_product_description(product: ProductBase) -> str:
-    global model
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool shared by all summarization requests, so GEMINI_SUMMARY_CONCURRENCY bounds the whole process.
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=GEMINI_SUMMARY_CONCURRENCY, thread_name_prefix="gemini")
+    return _executor
+
+
+def warmup():
+    llm_client.warmup()
+
 
+def generate_product_description(product: ProductBase) -> str:
     prompt = f"""
     Write a compelling product description IN TURKISH LANGUAGE for the following product:
 
@@ -34,21 +60,17 @@ def generate_product_description(product: ProductBase) -> str:
     Keep it under 100 words. 
     Do not use a title or description introductory sentence.
     """
-    response = model.generate_content(prompt)
-    return response.text.strip()
+    return llm_client.generate(prompt, stub=f"{product.title} - {product.brand}").strip()
 
 
 def refine_query(user_input):
-    global model
-
     prompt = f"""
     You are an AI assistant helping refine user queries in an e-commerce website.
     User queries: "{user_input}"
     Refine the query, don't be creative, just refine what the user intended to search.
     Only return the expected refined query.
     """
-    response = model.generate_content(prompt)
-    return response.text.strip()
+    return llm_client.generate(prompt, deadline_seconds=QUERY_REFINE_DEADLINE_SECONDS, stub=user_input).strip()
 
 
 def chunk_comments(comments: List[str], chunk_size: int = 50) -> List[List[str]]:
@@ -56,8 +78,6 @@ def chunk_comments(comments: List[str], chunk_size: int = 50) -> List[List[str]]
 
 
 def summarize_chunk(comments_chunk: List[str]) -> str:
-    global model
-
     reviews_text = "\n".join(f"- {c}" for c in comments_chunk)
     prompt = f"""
         You are an AI assistant helping summarize product reviews.
@@ -69,13 +89,10 @@ def summarize_chunk(comments_chunk: List[str]) -> str:
         Reviews:
         {reviews_text}
         """
-    response = model.generate_content(prompt)
-    return response.text
+    return llm_client.generate(prompt)
 
 
 def merge_summaries(summaries: List[str]) -> str:
-    global model
-
     summaries_text = "\n\n".join(summaries)
     prompt = f"""
         You are an AI assistant.
@@ -87,14 +104,73 @@ def merge_summaries(summaries: List[str]) -> str:
         Summaries:
         {summaries_text}
         """
-    response = model.generate_content(prompt)
-    return response.text
+    return llm_client.generate(prompt)
+
+
+def run_concurrently(fn: Callable[[list], str], batches: List[list], allow_partial: bool = False) -> List[str]:
+    """
+    Run `fn` on every batch in the shared pool, results in the order of `batches`.
 
+    A batch that still fails (LLMUnavailable) raises. With `allow_partial`
+    the results stop before the first failed batch instead, and it only
+    raises when that is the first batch.
+    """
+    futures = [get_executor().submit(fn, batch) for batch in batches]
+
+    results = []
+    try:
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception:
+                if not allow_partial or not results:
+                    raise
+                return results
+        return results
+    finally:
+        # Batches not started yet are of no use anymore once one failed
+        for future in futures:
+            future.cancel()
+
+
+def summarize_chunks(comments: List[str]) -> Tuple[List[str], int]:
+    """
+    Summarize comments COMMENT_CHUNK_SIZE at a time, concurrently.
 
-def generate_comment_summary(all_comments: List[str]) -> str:
-    chunks = chunk_comments(all_comments, chunk_size=50)
+    A chunk that cannot be summarized leaves out its summary and those of
+    the chunks after it, so the summaries always cover the leading comments.
+
+    Returns:
+        Tuple: Chunk summaries and the number of leading comments they cover.
+    """
+    chunks = chunk_comments(comments, chunk_size=COMMENT_CHUNK_SIZE)
     print(f"Total chunks to process: {len(chunks)}")
 
-    chunk_summaries = [summarize_chunk(chunk) for chunk in chunks]
-    final_summary = merge_summaries(chunk_summaries)
-    return final_summary
+    summaries = run_concurrently(summarize_chunk, chunks, allow_partial=True)
+    return summaries, sum(len(chunk) for chunk in chunks[:len(summaries)])
+
+
+def merge_tree(summaries: List[str]) -> str:
+    """
+    Merge summaries GEMINI_MERGE_FANIN at a time, level by level, until one is left.
+
+    No merge prompt holds more than GEMINI_MERGE_FANIN summaries, and each
+    level's merges run concurrently, so the time grows with the depth of
+    the tree rather than with the number of chunks.
+    """
+    if not summaries:
+        return ""
+
+    while True:
+        groups = [summaries[i:i + GEMINI_MERGE_FANIN] for i in range(0, len(summaries), GEMINI_MERGE_FANIN)]
+        summaries = run_concurrently(merge_summaries, groups)
+        if len(summaries) == 1:
+            return summaries[0]
+
+
+def generate_comment_summary(all_comments: List[str]) -> Tuple[str, int]:
+    """
+    Summary of the leading comments, and how many of them it covers, see `summarize_chunks`.
+    """
+    summaries, covered = summarize_chunks(all_comments)
+    return merge_tree(summaries), covered
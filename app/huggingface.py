@@ -1,42 +1,253 @@
-from sentence_transformers import SentenceTransformer
-from transformers import pipeline
+import os
+import hashlib
+import threading
+from dotenv import load_dotenv
 import numpy as np
+from concurrent.futures import Future
+from typing import List, Union
+from app.batching import MicroBatcher
+from app.model_client import MODEL_SERVER_SOCKET, ModelServerError, get_model_client
 
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
 
-embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-sentiment_model = pipeline("sentiment-analysis", model="savasy/bert-base-turkish-sentiment-cased")
+# Concurrent inference requests are grouped into batches of at most this many
+# items, waiting at most INFERENCE_MAX_WAIT_MS for the batch to fill up.
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv('INFERENCE_MAX_BATCH_SIZE', '32'))
+INFERENCE_MAX_WAIT_MS = float(os.getenv('INFERENCE_MAX_WAIT_MS', '5'))
+
+# Inference backend for both models: "torch" (fp32), "quantized" (dynamic int8
+# quantization of the Linear layers) or "onnx" (ONNX Runtime, needs the
+# optional optimum[onnxruntime] package).
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'torch')
+# Optional file inside the model repo to load with the onnx backend, e.g. onnx/model_qint8_avx2.onnx
+ONNX_EMBEDDING_FILE = os.getenv('ONNX_EMBEDDING_FILE')
+
+INFERENCE_BACKENDS = ("torch", "quantized", "onnx")
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+SENTIMENT_MODEL_NAME = "savasy/bert-base-turkish-sentiment-cased"
+
+# Models are loaded on first use (or by warmup), so workers that never run
+# inference neither import torch nor keep the weights in memory.
+embedding_model = None
+sentiment_model = None
+_model_lock = threading.Lock()
+
+
+def check_backend(backend: str):
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}, expected one of {', '.join(INFERENCE_BACKENDS)}")
+
+    if backend == "onnx":
+        try:
+            import onnxruntime  # noqa: F401
+            import optimum.onnxruntime  # noqa: F401
+        except ImportError:
+            raise RuntimeError("The onnx inference backend needs optimum[onnxruntime]: pip install 'optimum[onnxruntime]'")
+
+
+def quantize(module):
+    import torch
+
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_embedding_model(backend: str = INFERENCE_BACKEND):
+    """
+    Load the MiniLM sentence embedder for the given inference backend.
+    """
+    check_backend(backend)
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        model_kwargs = {"file_name": ONNX_EMBEDDING_FILE} if ONNX_EMBEDDING_FILE else None
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx", model_kwargs=model_kwargs)
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu" if backend == "quantized" else None)
+    if backend == "quantized":
+        model = quantize(model)
+    return model
+
+
+def load_sentiment_model(backend: str = INFERENCE_BACKEND):
+    """
+    Load the Turkish BERT sentiment pipeline for the given inference backend.
+    """
+    check_backend(backend)
+    from transformers import pipeline
+
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from transformers import AutoTokenizer
+
+        model = ORTModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL_NAME, export=True)
+        tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL_NAME)
+        return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+
+    classifier = pipeline("sentiment-analysis", model=SENTIMENT_MODEL_NAME, device="cpu" if backend == "quantized" else None)
+    if backend == "quantized":
+        classifier.model = quantize(classifier.model)
+    return classifier
+
+
+def get_embedding_model():
+    global embedding_model
+
+    if embedding_model is None:
+        with _model_lock:
+            if embedding_model is None:
+                embedding_model = load_embedding_model()
+    return embedding_model
+
+
+def get_sentiment_model():
+    global sentiment_model
+
+    if sentiment_model is None:
+        with _model_lock:
+            if sentiment_model is None:
+                sentiment_model = load_sentiment_model()
+    return sentiment_model
+
+
+def warmup():
+    """
+    Load both models ahead of the first request.
+    """
+    get_embedding_model()
+    get_sentiment_model()
+
+
+def encode_batch(texts: List[str]) -> List[np.ndarray]:
+    return list(get_embedding_model().encode(texts, batch_size=len(texts)))
+
+
+def classify_batch(texts: List[str]) -> List[dict]:
+    # Comments longer than the model's 512 tokens are classified on their beginning instead of failing the batch
+    return get_sentiment_model()(texts, batch_size=len(texts), truncation=True)
+
+
+embedding_batcher = MicroBatcher(
+    encode_batch,
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+    name="embedding-batcher"
+)
+sentiment_batcher = MicroBatcher(
+    classify_batch,
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+    name="sentiment-batcher"
+)
+
+
+def run_embedding(text: str) -> np.ndarray:
+    if MODEL_SERVER_SOCKET:
+        return get_model_client().call("embed", text)
+    return embedding_batcher(text)
+
+
+def run_sentiment(text: str) -> dict:
+    if MODEL_SERVER_SOCKET:
+        return get_model_client().call("classify", text)
+    return sentiment_batcher(text)
+
+
+def run_embedding_batch(texts: List[str]) -> List[np.ndarray]:
+    if MODEL_SERVER_SOCKET:
+        return get_model_client().call("embed_batch", texts)
+    futures = [embedding_batcher.submit(text) for text in texts]
+    return [future.result() for future in futures]
+
+
+def future_outcomes(futures: List[Future]) -> list:
+    """
+    Result of each future, or the exception it raised, in order.
+    """
+    outcomes = []
+    for future in futures:
+        try:
+            outcomes.append(future.result())
+        except Exception as e:
+            outcomes.append(e)
+    return outcomes
+
+
+def run_sentiment_batch(texts: List[str]) -> List[Union[dict, Exception]]:
+    if MODEL_SERVER_SOCKET:
+        outcomes = get_model_client().call("classify_each", texts)
+        return [result if status == "ok" else ModelServerError(result) for status, result in outcomes]
+    return future_outcomes([sentiment_batcher.submit(text) for text in texts])
+
+
+def product_embedding_text(title: str, description: str, brand: str) -> str:
+    return f"Title: {title}\nDescription: {description}\nBrand: {brand}"
+
+
+def product_embedding_hash(title: str, description: str, brand: str) -> str:
+    """
+    SHA-256 of the text a product embedding is computed from.
+
+    Stored next to the embedding, so only changes to the embedded text
+    (not to price, stock, ...) trigger a re-embed.
+    """
+    return hashlib.sha256(product_embedding_text(title, description, brand).encode()).hexdigest()
 
 
 def embed_product(title: str, description: str, brand: str):
     """
     Create an embedding for a product and save it to the embedding column.
-    
+
     Args:
         title (str): Product title.
         description (str): Product description.
         brand (str): Product brand.
-    
+
     Returns:
         List: Returns the embedding of the product.
     """
-    global embedding_model
-
-    text = f"Title: {title}\nDescription: {description}\nBrand: {brand}"
+    text = product_embedding_text(title, description, brand)
 
-    embedding = embedding_model.encode(text)
+    embedding = run_embedding(text)
     embedding = embedding / np.linalg.norm(embedding)
     embedding = embedding.tolist()
 
     return embedding
 
 
+def embed_products(products: List[tuple]) -> List[list]:
+    """
+    Embed many products at once, the texts go to the model in batches.
+
+    Args:
+        products (List): `(title, description, brand)` tuples.
+
+    Returns:
+        List: Normalized embeddings, in the order of `products`.
+    """
+    embeddings = run_embedding_batch([product_embedding_text(*product) for product in products])
+
+    return [(embedding / np.linalg.norm(embedding)).tolist() for embedding in embeddings]
+
+
 def embed_text(text: str):
-    global embedding_model
+    embedding = run_embedding(text)
 
-    embedding = embedding_model.encode(text)
-    
     return embedding
 
 
 def analyze_comment_sentiment(text: str):
-    return sentiment_model(text)
+    return [run_sentiment(text)]
+
+
+def analyze_comments_sentiment(texts: List[str]) -> List[Union[dict, Exception]]:
+    """
+    Classify many comments at once, the texts go to the model in batches.
+
+    A text the model fails on does not fail the others, its entry holds the exception instead.
+
+    Returns:
+        List: `{"label": ..., "score": ...}` dicts or exceptions, in the order of `texts`.
+    """
+    return run_sentiment_batch(texts)
@@ -0,0 +1,81 @@
+"""
+Compare an inference backend against the fp32 torch models.
+
+    python -m app.inference_check --backend onnx
+    python -m app.inference_check --backend quantized --texts reviews.txt
+
+Reports embedding cosine similarity and sentiment label agreement against
+the torch reference, and throughput of both backends on the same texts.
+"""
+import argparse
+import time
+import numpy as np
+from typing import List
+from app.huggingface import INFERENCE_BACKENDS, load_embedding_model, load_sentiment_model
+
+
+SAMPLE_TEXTS = [
+    "Ürün çok kaliteli, kargo da hızlı geldi. Herkese tavsiye ederim.",
+    "Telefonun bataryası bir gün bile dayanmıyor, hiç memnun kalmadım.",
+    "Fiyatına göre idare eder, beklentimi tam karşılamadı.",
+    "Kulaklığın ses kalitesi harika ama kutusu hasarlı geldi.",
+    "Wireless noise cancelling headphones with 30 hour battery life",
+    "Stainless steel kitchen knife set, dishwasher safe",
+    "Çocuklar için eğitici ahşap yapboz oyuncak",
+    "Satıcı çok ilgisiz, iade sürecinde hiç yardımcı olmadılar.",
+]
+
+
+def throughput(run, texts: List[str], batch_size: int, repeats: int) -> float:
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    run(batches[0])
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for batch in batches:
+            run(batch)
+    return len(texts) * repeats / (time.perf_counter() - started)
+
+
+def check(backend: str, texts: List[str], batch_size: int, repeats: int):
+    reference_embedder = load_embedding_model("torch")
+    candidate_embedder = load_embedding_model(backend)
+
+    reference = reference_embedder.encode(texts, normalize_embeddings=True)
+    candidate = candidate_embedder.encode(texts, normalize_embeddings=True)
+    similarity = np.sum(reference * candidate, axis=1)
+
+    print(f"Embedding cosine similarity vs torch: mean {similarity.mean():.5f}, min {similarity.min():.5f}")
+    for name, embedder in (("torch", reference_embedder), (backend, candidate_embedder)):
+        rate = throughput(lambda batch: embedder.encode(batch, batch_size=len(batch)), texts, batch_size, repeats)
+        print(f"Embedding throughput {name}: {rate:.1f} texts/s")
+
+    reference_classifier = load_sentiment_model("torch")
+    candidate_classifier = load_sentiment_model(backend)
+
+    reference_labels = reference_classifier(texts)
+    candidate_labels = candidate_classifier(texts)
+    agreement = np.mean([r["label"] == c["label"] for r, c in zip(reference_labels, candidate_labels)])
+    score_diff = max(abs(r["score"] - c["score"]) for r, c in zip(reference_labels, candidate_labels))
+
+    print(f"Sentiment label agreement vs torch: {agreement:.2%}, max score difference {score_diff:.4f}")
+    for name, classifier in (("torch", reference_classifier), (backend, candidate_classifier)):
+        rate = throughput(lambda batch: classifier(batch, batch_size=len(batch)), texts, batch_size, repeats)
+        print(f"Sentiment throughput {name}: {rate:.1f} texts/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check accuracy and throughput of an inference backend against torch fp32.")
+    parser.add_argument("--backend", choices=INFERENCE_BACKENDS, required=True)
+    parser.add_argument("--texts", help="File with one text per line, defaults to built-in samples")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.texts:
+        with open(args.texts, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = SAMPLE_TEXTS
+
+    check(args.backend, texts, args.batch_size, args.repeats)
@@ -0,0 +1,81 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class BackgroundJob(ABC):
+    """
+    Long running admin job executed in a daemon thread, one run at a time.
+
+    Subclasses implement `run(**options)` and report progress through
+    `_update` and `_advance`. Status is tracked per process: poll the
+    worker the job was started on.
+    """
+
+    name = "background-job"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = self.initial_status()
+
+    def initial_status(self, **options) -> dict:
+        return {
+            "state": "idle",
+            "total": 0,
+            "processed": 0,
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            **options
+        }
+
+    def status(self) -> dict:
+        with self._lock:
+            return dict(self._status)
+
+    def start(self, **options) -> bool:
+        """
+        Start the job in a background thread.
+
+        Returns:
+            bool: False if the job is already running.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+
+            self._status = self.initial_status(**options)
+            self._status["state"] = "running"
+            self._thread = threading.Thread(target=self.execute, kwargs=options, name=self.name, daemon=True)
+            self._thread.start()
+            return True
+
+    def execute(self, **options):
+        """
+        Run the job in the calling thread, recording its outcome in the status.
+        """
+        with self._lock:
+            self._status = self.initial_status(**options)
+            self._status.update(state="running", started_at=time.time())
+
+        try:
+            self.run(**options)
+            self._update(state="done", finished_at=time.time())
+        except Exception as e:
+            self._update(state="failed", finished_at=time.time(), error=f"{type(e).__name__}: {e}")
+
+    @abstractmethod
+    def run(self, **options):
+        """
+        The job itself; raising marks the run failed.
+        """
+
+    def _update(self, **values):
+        with self._lock:
+            self._status.update(values)
+
+    def _advance(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self._status[key] += value
@@ -0,0 +1,90 @@
+"""
+Measure lexical search latency with and without its indexes.
+
+    python -m app.lexical_check
+    python -m app.lexical_check --queries 200 --limit 10
+
+Searches products, users and categories for words sampled from their own
+titles and names, with the same match and relevance order the endpoints use.
+Each search runs once as planned (pg_trgm and tsvector GIN indexes) and once
+with index scans disabled, i.e. the sequential ILIKE scan the endpoints used
+before. Reports the row count, the median and p95 latency of both and
+whether the planner used the indexes. Run it against a database of
+production size; the indexes only pay off on large tables.
+"""
+import argparse
+import random
+import re
+import time
+import numpy as np
+from sqlalchemy import desc, func, select, text
+from app.database import SessionLocal
+from app.models import Category, Product, User
+from app.search import lexical_match, lexical_rank
+
+# Searched table: id column, trigram column, optional tsvector column
+TARGETS = {
+    "products": (Product.id, Product.title, Product.search_vector),
+    "users": (User.id, User.username, None),
+    "categories": (Category.id, Category.name, None)
+}
+
+
+def sample_terms(db, column, queries: int) -> list:
+    values = db.execute(select(column).order_by(func.random()).limit(queries)).scalars()
+    words = [word for value in values for word in re.findall(r"\w{3,}", value or "")]
+    return random.sample(words, min(queries, len(words)))
+
+
+def search_sql(search: str, id_column, trigram_column, vector_column, limit: int):
+    rank = lexical_rank(search, trigram_column, vector_column)
+    return select(id_column).\
+        where(lexical_match(search, trigram_column, vector_column)).\
+        order_by(desc(rank), id_column).\
+        limit(limit)
+
+
+def timed(db, sql) -> float:
+    started = time.perf_counter()
+    db.execute(sql).all()
+    return time.perf_counter() - started
+
+
+def check(queries: int, limit: int):
+    db = SessionLocal()
+    try:
+        for name, (id_column, trigram_column, vector_column) in TARGETS.items():
+            rows = db.execute(select(func.count()).select_from(id_column.table)).scalar()
+            terms = sample_terms(db, trigram_column, queries)
+            if not terms:
+                print(f"{name}: {rows} rows, nothing to search")
+                continue
+
+            indexed_seconds, scan_seconds = [], []
+            for term in terms:
+                sql = search_sql(term, id_column, trigram_column, vector_column, limit)
+                indexed_seconds.append(timed(db, sql))
+
+                db.execute(text("SET LOCAL enable_indexscan = off"))
+                db.execute(text("SET LOCAL enable_bitmapscan = off"))
+                scan_seconds.append(timed(db, sql))
+                db.rollback()
+
+            compiled = search_sql(terms[0], id_column, trigram_column, vector_column, limit).compile(dialect=db.bind.dialect)
+            plan = "\n".join(db.connection().exec_driver_sql(f"EXPLAIN {compiled}", compiled.params).scalars())
+            db.rollback()
+
+            print(f"{name}: {rows} rows, {len(terms)} queries, limit {limit}, indexes used: {'Bitmap Index Scan' in plan}")
+            for label, seconds in (("indexed", indexed_seconds), ("sequential", scan_seconds)):
+                print(f"  Latency {label}: median {np.median(seconds) * 1000:.2f} ms, p95 {np.percentile(seconds, 95) * 1000:.2f} ms")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure lexical search latency with and without its indexes.")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    check(args.queries, args.limit)
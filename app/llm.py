@@ -0,0 +1,329 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import os
+import random
+import threading
+import time
+from dotenv import load_dotenv
+from typing import Optional
+from app.llm_cache import llm_response_cache
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
+
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_MODEL_NAME = "gemini-2.5-pro"
+
+# "gemini", or "stub" for deterministic local responses in tests and load benchmarks
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+# Concurrent LLM calls per process, across all requests
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', '16'))
+# Seconds per attempt, and in total per call including queueing and retries
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '30'))
+LLM_DEADLINE_SECONDS = float(os.getenv('LLM_DEADLINE_SECONDS', '60'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+# Consecutive failed calls that open the circuit, and seconds until a trial call is let through
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))
+LLM_STUB_LATENCY_MS = float(os.getenv('LLM_STUB_LATENCY_MS', '0'))
+
+
+class LLMUnavailable(RuntimeError):
+    """
+    The LLM could not answer in time: the circuit is open, the deadline passed or every attempt failed.
+    """
+
+
+class LLMRequestError(LLMUnavailable):
+    """
+    The upstream refused this call, e.g. an invalid API key or a blocked prompt or response.
+
+    Retrying would get the same answer and it says nothing about the
+    upstream's health, so it is neither retried nor counted by the breaker.
+    """
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Timeouts, connection errors and 429 / 5xx answers, the failures worth retrying.
+
+    Google API errors carry the HTTP status as `code`.
+    """
+    if isinstance(error, (asyncio.TimeoutError, OSError)):
+        return True
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and (code == 429 or code >= 500)
+
+
+class GeminiBackend:
+    def __init__(self, model_name: str = GEMINI_MODEL_NAME):
+        self.name = model_name
+        # Configured on first use (or by warmup) instead of at import time
+        self.model = None
+        self._lock = threading.Lock()
+
+    def get_model(self):
+        if self.model is None:
+            with self._lock:
+                if self.model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=GEMINI_API_KEY)
+                    self.model = genai.GenerativeModel(self.name)
+        return self.model
+
+    async def generate(self, prompt: str, timeout: float, stub: Optional[str] = None) -> str:
+        response = await self.get_model().generate_content_async(prompt, request_options={"timeout": timeout})
+        return response.text
+
+
+class StubBackend:
+    """
+    Answers without a network call: `stub` when the caller gives one, otherwise a digest of the prompt.
+
+    The same prompt always gets the same response, after LLM_STUB_LATENCY_MS.
+    """
+
+    name = "stub"
+
+    def get_model(self):
+        return None
+
+    async def generate(self, prompt: str, timeout: float, stub: Optional[str] = None) -> str:
+        if LLM_STUB_LATENCY_MS:
+            await asyncio.sleep(LLM_STUB_LATENCY_MS / 1000)
+        if stub is not None:
+            return stub
+        return f"Stub response {hashlib.sha256(prompt.encode()).hexdigest()[:16]}"
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast after `failures` consecutive failures.
+
+    Once open, calls are refused for `reset_seconds`; then one trial call is
+    let through (half open) and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, failures: int, reset_seconds: float):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> Optional[str]:
+        """
+        Admit a call: "closed", "trial" for the one call let through while half open, or None when refused.
+        """
+        with self._lock:
+            state = self.state()
+            if state == "closed":
+                return "closed"
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return "trial"
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.trial_running or self.consecutive_failures >= self.failures:
+                if self.opened_at is None or self.trial_running:
+                    self.times_opened += 1
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def end_trial(self):
+        """
+        Free the half open slot of a trial call that ended without an outcome, e.g. cancelled.
+        """
+        with self._lock:
+            self.trial_running = False
+
+
+class LLMClient:
+    """
+    Runs LLM calls on one event loop in a daemon thread.
+
+    Callers from any thread block in `generate` until the answer or the
+    deadline, whichever comes first, so a slow upstream can hold a request
+    for at most its deadline. Every call waits for one of LLM_CONCURRENCY
+    slots, each attempt gets LLM_TIMEOUT_SECONDS, failures are retried with
+    jittered exponential backoff while the deadline allows, and the circuit
+    breaker refuses calls outright while the upstream keeps failing. Only
+    transient failures are retried and counted by the breaker, other errors
+    raise LLMRequestError right away. Callers catch LLMUnavailable (which
+    includes LLMRequestError) and degrade.
+    """
+
+    def __init__(self, backend, concurrency: int = LLM_CONCURRENCY):
+        self.backend = backend
+        self.breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS)
+        self.concurrency = concurrency
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self._stats_lock = threading.Lock()
+        self._loop = None
+        self._semaphore = None
+        self._loop_lock = threading.Lock()
+
+    @property
+    def model_name(self) -> str:
+        return self.backend.name
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._loop_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+                    self._semaphore = asyncio.Semaphore(self.concurrency)
+                    self._loop = loop
+        return self._loop
+
+    def warmup(self):
+        self._get_loop()
+        self.backend.get_model()
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for key, value in increments.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "backend": self.model_name,
+                "breaker_state": self.breaker.state(),
+                "breaker_opened": self.breaker.times_opened,
+                "calls": self.calls,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "in_flight": self.in_flight
+            }
+
+    async def agenerate(self, prompt: str, deadline: float, stub: Optional[str] = None) -> str:
+        """
+        Generate on the client's loop, giving up at the `deadline` (a time.monotonic() value).
+        """
+        admission = self.breaker.allow()
+        if admission is None:
+            self._count(rejected=1)
+            raise LLMUnavailable("LLM circuit breaker is open")
+
+        self._count(calls=1)
+        recorded = False
+        try:
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                # Local queueing, says nothing about the upstream
+                self._count(timeouts=1, failures=1)
+                raise LLMUnavailable("Deadline passed waiting for an LLM slot")
+
+            self._count(in_flight=1)
+            try:
+                error = None
+                attempted = False
+                for attempt in range(LLM_MAX_RETRIES + 1):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    attempted = True
+                    try:
+                        timeout = min(LLM_TIMEOUT_SECONDS, remaining)
+                        text = await asyncio.wait_for(self.backend.generate(prompt, timeout, stub=stub), timeout=timeout)
+                        self.breaker.record_success()
+                        recorded = True
+                        return text
+                    except asyncio.TimeoutError as e:
+                        self._count(timeouts=1)
+                        error = e
+                    except Exception as e:
+                        if not is_transient(e):
+                            self._count(failures=1)
+                            raise LLMRequestError(f"LLM call refused: {type(e).__name__}: {e}") from e
+                        error = e
+
+                    backoff = (2 ** attempt) * (0.5 + random.random() / 2)
+                    if attempt == LLM_MAX_RETRIES or time.monotonic() + backoff >= deadline:
+                        break
+                    await asyncio.sleep(backoff)
+
+                self._count(failures=1)
+                if attempted:
+                    self.breaker.record_failure()
+                    recorded = True
+                raise LLMUnavailable(f"LLM call failed: {type(error).__name__}: {error}" if error else "LLM call deadline passed")
+            finally:
+                self._count(in_flight=-1)
+                self._semaphore.release()
+        finally:
+            # A trial that timed out in the queue or was cancelled (CancelledError
+            # is not an Exception) must not keep the circuit half open forever
+            if admission == "trial" and not recorded:
+                self.breaker.end_trial()
+
+    def generate(self, prompt: str, deadline_seconds: float = LLM_DEADLINE_SECONDS, stub: Optional[str] = None, cache: bool = True) -> str:
+        """
+        Generate a response, blocking the calling thread for at most `deadline_seconds`.
+
+        Responses are looked up in and stored to the persistent response
+        cache first, so a repeated prompt costs a lookup instead of a call.
+
+        Args:
+            prompt (str): Prompt text.
+            deadline_seconds (float): Total time allowed, including waiting for a slot and retries.
+            stub (str): Response of the stub backend, for calls whose output is used (e.g. a refined query).
+            cache (bool): Go through the response cache.
+
+        Raises:
+            LLMUnavailable: The call did not succeed before the deadline.
+        """
+        cache = cache and llm_response_cache.enabled
+        if cache:
+            cached = llm_response_cache.get(self.model_name, prompt)
+            if cached is not None:
+                return cached
+
+        response = self._generate(prompt, deadline_seconds, stub)
+
+        if cache:
+            llm_response_cache.put(self.model_name, prompt, response)
+        return response
+
+    def _generate(self, prompt: str, deadline_seconds: float, stub: Optional[str]) -> str:
+        deadline = time.monotonic() + deadline_seconds
+        future = asyncio.run_coroutine_threadsafe(self.agenerate(prompt, deadline, stub=stub), self._get_loop())
+        try:
+            # agenerate gives up at the deadline itself, the margin only covers a stuck cancellation
+            return future.result(timeout=deadline_seconds + 5)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise LLMUnavailable("LLM call deadline passed")
+
+
+if LLM_BACKEND not in ("gemini", "stub"):
+    raise ValueError(f"Unknown LLM_BACKEND: {LLM_BACKEND}, expected gemini or stub")
+
+llm_client = LLMClient(StubBackend() if LLM_BACKEND == "stub" else GeminiBackend())
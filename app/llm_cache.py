@@ -0,0 +1,169 @@
+import hashlib
+import math
+import os
+import threading
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
+from typing import Optional
+from app.database import database_url
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
+
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', '604800'))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '100000'))
+# The cache has its own small connection pool, so lookups never wait for (or
+# take) request connections. Waiting for a connection and each statement are
+# cut off after LLM_CACHE_TIMEOUT_MS, a slow cache counts as a miss.
+LLM_CACHE_POOL_SIZE = int(os.getenv('LLM_CACHE_POOL_SIZE', '4'))
+LLM_CACHE_TIMEOUT_MS = int(os.getenv('LLM_CACHE_TIMEOUT_MS', '200'))
+
+# Stores between two eviction passes
+EVICT_EVERY = 100
+
+GET_RESPONSE = text("""
+    SELECT response
+    FROM llm_response_cache
+    WHERE model = :model
+        AND prompt_hash = :prompt_hash
+        AND expires_at > NOW()
+""")
+
+PUT_RESPONSE = text("""
+    INSERT INTO llm_response_cache (model, prompt_hash, response, created_at, expires_at)
+    VALUES (:model, :prompt_hash, :response, NOW(), NOW() + make_interval(secs => :ttl))
+    ON CONFLICT (model, prompt_hash) DO UPDATE SET
+        response = EXCLUDED.response,
+        created_at = EXCLUDED.created_at,
+        expires_at = EXCLUDED.expires_at
+""")
+
+
+cache_engine = create_engine(
+    url=database_url,
+    pool_size=LLM_CACHE_POOL_SIZE,
+    max_overflow=0,
+    pool_timeout=LLM_CACHE_TIMEOUT_MS / 1000,
+    # libpq rounds connect timeouts below 2 seconds up to 2
+    connect_args={
+        "connect_timeout": max(2, math.ceil(LLM_CACHE_TIMEOUT_MS / 1000)),
+        "options": f"-c statement_timeout={LLM_CACHE_TIMEOUT_MS}"
+    }
+)
+CacheSession = sessionmaker(autocommit=False, autoflush=False, bind=cache_engine)
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Content addressed cache of LLM responses in the llm_response_cache table.
+
+    Keys are the model name and the SHA-256 of the prompt, so every process
+    and restart shares the entries. Entries expire after `ttl` seconds and,
+    past `max_entries`, the oldest are evicted every EVICT_EVERY stores.
+    Database errors and timeouts only turn lookups into misses. Hit and
+    miss counters are per process.
+    """
+
+    def __init__(self, enabled: bool, ttl: int, max_entries: int):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evicted = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def get(self, model: str, prompt: str) -> Optional[str]:
+        db = CacheSession()
+        try:
+            response = db.execute(GET_RESPONSE, {"model": model, "prompt_hash": prompt_hash(prompt)}).scalar()
+        except SQLAlchemyError:
+            self._count(errors=1, misses=1)
+            return None
+        finally:
+            db.close()
+
+        if response is None:
+            self._count(misses=1)
+        else:
+            self._count(hits=1)
+        return response
+
+    def put(self, model: str, prompt: str, response: str):
+        db = CacheSession()
+        try:
+            db.execute(PUT_RESPONSE, {"model": model, "prompt_hash": prompt_hash(prompt), "response": response, "ttl": self.ttl})
+            db.commit()
+
+            with self._lock:
+                self.stores += 1
+                evict = self.stores % EVICT_EVERY == 0
+            if evict:
+                self.evict(db)
+        except SQLAlchemyError:
+            self._count(errors=1)
+        finally:
+            db.close()
+
+    def evict(self, db: Session) -> int:
+        """
+        Delete expired entries, then the oldest ones beyond `max_entries`.
+
+        Returns:
+            int: Number of entries deleted.
+        """
+        # Deleting many rows may take longer than a lookup is allowed to
+        db.execute(text("SET LOCAL statement_timeout = 0"))
+        deleted = db.execute(text("DELETE FROM llm_response_cache WHERE expires_at <= NOW()")).rowcount
+        deleted += db.execute(text("""
+            DELETE FROM llm_response_cache
+            WHERE (model, prompt_hash) IN (
+                SELECT model, prompt_hash
+                FROM llm_response_cache
+                ORDER BY created_at DESC
+                OFFSET :max_entries
+            )
+        """), {"max_entries": self.max_entries}).rowcount
+        db.commit()
+
+        self._count(evicted=deleted)
+        return deleted
+
+    def stats(self, db: Session) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "enabled": self.enabled,
+                "maxsize": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "evicted": self.evicted,
+                "errors": self.errors
+            }
+
+        stats["size"] = db.execute(text("SELECT count(*) FROM llm_response_cache")).scalar()
+        return stats
+
+
+llm_response_cache = LLMResponseCache(
+    enabled=LLM_CACHE_ENABLED,
+    ttl=LLM_CACHE_TTL_SECONDS,
+    max_entries=LLM_CACHE_MAX_ENTRIES
+)
@@ -0,0 +1,22 @@
+from sqlalchemy.orm import joinedload, selectinload
+from app.models import Cart, CartItem, Product, User
+
+
+# Loader policy for everything the response schemas serialize. Many-to-one
+# relationships are joined into the parent statement, collections are fetched
+# with one extra SELECT ... WHERE id IN (...) per level, so the number of
+# statements per request is fixed no matter how many rows a page holds.
+
+# ProductBase -> category
+PRODUCT_LOADER = joinedload(Product.category)
+
+# CartBase -> cart_items -> product -> category
+CART_LOADER = selectinload(Cart.cart_items).\
+    joinedload(CartItem.product).\
+    joinedload(Product.category)
+
+# UserBase / AccountBase -> carts -> cart_items -> product -> category
+USER_LOADER = selectinload(User.carts).\
+    selectinload(Cart.cart_items).\
+    joinedload(CartItem.product).\
+    joinedload(Product.category)
@@ -1,11 +1,47 @@
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routers import accounts, auth, carts, categories, products, users, comments
+from app.routers import accounts, admin, auth, carts, categories, products, users, comments
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import Base, engine
+from app.search_cache import query_cache
+from app.warmup import WARMUP_MODELS, warmup_all
+from app.vector_index import VECTOR_INDEX_ENABLED, VECTOR_INDEX_REFRESH_SECONDS, load_vector_index, refresh_loop
+from app import copurchase
+from app.sentiment_worker import SENTIMENT_WORKER_ENABLED, sentiment_worker
 
 Base.metadata.create_all(engine)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    query_cache.load()
+    if WARMUP_MODELS:
+        warmup_all()
+
+    stop = threading.Event()
+    if VECTOR_INDEX_ENABLED:
+        load_vector_index()
+        if VECTOR_INDEX_REFRESH_SECONDS:
+            threading.Thread(target=refresh_loop, args=(stop,), name="vector-index-refresh", daemon=True).start()
+    if copurchase.COPURCHASE_ENABLED:
+        copurchase.load_copurchase_matrix()
+        if copurchase.COPURCHASE_SNAPSHOT_PATH:
+            threading.Thread(target=copurchase.snapshot_loop, args=(stop,), name="copurchase-snapshot", daemon=True).start()
+        if copurchase.COPURCHASE_REFRESH_SECONDS:
+            threading.Thread(target=copurchase.refresh_loop, args=(stop,), name="copurchase-refresh", daemon=True).start()
+    if SENTIMENT_WORKER_ENABLED:
+        threading.Thread(target=sentiment_worker.run, args=(stop,), name="sentiment-worker", daemon=True).start()
+
+    yield
+
+    stop.set()
+    sentiment_worker.wake()
+    query_cache.save()
+    copurchase.save_copurchase_matrix()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["*"]
 
@@ -18,6 +54,7 @@ app.add_middleware(
 )
 
 app.include_router(accounts.router)
+app.include_router(admin.router)
 app.include_router(auth.router)
 app.include_router(carts.router)
 app.include_router(categories.router)
@@ -0,0 +1,85 @@
+import os
+import queue
+import threading
+from dotenv import load_dotenv
+from multiprocessing.connection import Client, Connection
+from typing import Any
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
+
+# Unix socket of the model server (python -m app.model_server). When unset,
+# inference runs inside the API worker.
+MODEL_SERVER_SOCKET = os.getenv('MODEL_SERVER_SOCKET')
+# Shared secret of the model server and its clients, required: connections
+# exchange pickles, so whoever could connect without it could run code in the server
+MODEL_SERVER_AUTHKEY = os.getenv('MODEL_SERVER_AUTHKEY')
+MODEL_CLIENT_POOL_SIZE = int(os.getenv('MODEL_CLIENT_POOL_SIZE', '8'))
+
+
+if MODEL_SERVER_SOCKET and not MODEL_SERVER_AUTHKEY:
+    raise ValueError("MODEL_SERVER_AUTHKEY must be set with MODEL_SERVER_SOCKET, the same value as the model server's")
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+class ModelClient:
+    """
+    Connection pool to the model server.
+
+    Each call borrows a connection, sends `(op, payload)` and waits for
+    `("ok", result)` or `("error", message)`. Requests from concurrent
+    threads use separate connections, so the server can batch them.
+    """
+
+    def __init__(self, socket_path: str, authkey: str, pool_size: int = 8):
+        self.socket_path = socket_path
+        self.authkey = authkey.encode()
+        self._pool = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _connect(self) -> Connection:
+        return Client(self.socket_path, family="AF_UNIX", authkey=self.authkey)
+
+    def call(self, op: str, payload: Any) -> Any:
+        with self._slots:
+            try:
+                connection = self._pool.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+
+            try:
+                connection.send((op, payload))
+                status, result = connection.recv()
+            except (EOFError, OSError):
+                # The server restarted since this connection was opened, retry once on a fresh one
+                connection.close()
+                connection = self._connect()
+                connection.send((op, payload))
+                status, result = connection.recv()
+
+            self._pool.put(connection)
+
+        if status != "ok":
+            raise ModelServerError(result)
+        return result
+
+
+model_client = None
+_client_lock = threading.Lock()
+
+
+def get_model_client() -> ModelClient:
+    global model_client
+
+    if model_client is None:
+        with _client_lock:
+            if model_client is None:
+                model_client = ModelClient(
+                    socket_path=MODEL_SERVER_SOCKET,
+                    authkey=MODEL_SERVER_AUTHKEY,
+                    pool_size=MODEL_CLIENT_POOL_SIZE
+                )
+    return model_client
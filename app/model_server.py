@@ -0,0 +1,89 @@
+"""
+Model server hosting the embedding and sentiment models out of the API process.
+
+Run one (or more, on different sockets) next to the API workers:
+
+    MODEL_SERVER_AUTHKEY=... python -m app.model_server --socket /tmp/models.sock
+
+and point the API at it with MODEL_SERVER_SOCKET=/tmp/models.sock and the
+same MODEL_SERVER_AUTHKEY, e.g. from
+`python -c "import secrets; print(secrets.token_hex(32))"`. Requests are
+pickles, so the authkey is required and the socket is only accessible to
+the user running the server; API workers must run as that user. Every
+connection is served by its own thread; the threads feed the same
+micro-batchers, so requests from all API workers are batched together.
+"""
+import argparse
+import os
+import threading
+from multiprocessing.connection import Listener, Connection
+from app.huggingface import embedding_batcher, future_outcomes, sentiment_batcher, warmup
+from app.model_client import MODEL_SERVER_SOCKET, MODEL_SERVER_AUTHKEY
+
+
+OPERATIONS = {
+    "embed": embedding_batcher,
+    "embed_batch": lambda texts: [future.result() for future in [embedding_batcher.submit(text) for text in texts]],
+    "classify": sentiment_batcher,
+    # One outcome per text, so a text that fails does not fail the others
+    "classify_each": lambda texts: [
+        ("error", f"{type(outcome).__name__}: {outcome}") if isinstance(outcome, Exception) else ("ok", outcome)
+        for outcome in future_outcomes([sentiment_batcher.submit(text) for text in texts])
+    ],
+    "stats": lambda _: {
+        "embedding": embedding_batcher.stats(),
+        "sentiment": sentiment_batcher.stats()
+    }
+}
+
+
+def handle_connection(connection: Connection):
+    with connection:
+        while True:
+            try:
+                op, payload = connection.recv()
+            except (EOFError, OSError):
+                return
+
+            try:
+                connection.send(("ok", OPERATIONS[op](payload)))
+            except KeyError:
+                connection.send(("error", f"Unknown operation: {op}"))
+            except Exception as e:
+                connection.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def serve(socket_path: str, authkey: str):
+    if not authkey:
+        raise SystemExit('MODEL_SERVER_AUTHKEY is required, e.g. python -c "import secrets; print(secrets.token_hex(32))"')
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    warmup()
+
+    # Created owner only (0600), other local users cannot even attempt the handshake
+    umask = os.umask(0o177)
+    try:
+        listener = Listener(socket_path, family="AF_UNIX", authkey=authkey.encode())
+    finally:
+        os.umask(umask)
+
+    with listener:
+        print(f"Model server listening on {socket_path}")
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception as e:
+                # A failed handshake must not take the server down
+                print(f"Rejected model server connection: {e}")
+                continue
+            threading.Thread(target=handle_connection, args=(connection,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve embedding and sentiment inference over a Unix socket.")
+    parser.add_argument("--socket", default=MODEL_SERVER_SOCKET or "/tmp/ecommerce-models.sock")
+    args = parser.parse_args()
+
+    serve(args.socket, MODEL_SERVER_AUTHKEY)
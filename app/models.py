@@ -1,9 +1,24 @@
-from sqlalchemy import Boolean, Column, Integer, String, ForeignKey, Float, ARRAY
+import os
+from dotenv import load_dotenv
+from sqlalchemy import Boolean, Column, Integer, String, ForeignKey, Float, ARRAY, Index, Computed, LargeBinary, cast, func
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.sql.expression import text
 from sqlalchemy.sql.sqltypes import TIMESTAMP
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from app.database import Base
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import Vector, HALFVEC, BIT
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
+
+# Representation the product embedding HNSW index is built on: "vector" (float32),
+# "halfvec" (float16, pgvector >= 0.7), "binary" (1 bit per dimension, pgvector >= 0.7)
+# or "pca" (the PCA projection to EMBEDDING_PCA_DIM dimensions, see app.reduction).
+# The full float32 vector always stays in the table and is used to re-rank.
+EMBEDDING_STORAGE = os.getenv('EMBEDDING_STORAGE', 'vector')
+EMBEDDING_STORAGES = ("vector", "halfvec", "binary", "pca")
+EMBEDDING_DIM = 384
+EMBEDDING_PCA_DIM = int(os.getenv('EMBEDDING_PCA_DIM', '128'))
 
 
 class User(Base):
@@ -24,6 +39,11 @@ class User(Base):
     carts = relationship("Cart", back_populates="user")
     comments = relationship("Comment", back_populates="user")
 
+    # Trigram index backing the username search
+    __table_args__ = (
+        Index("ix_users_username_trgm", "username", postgresql_using="gin", postgresql_ops={"username": "gin_trgm_ops"}),
+    )
+
 
 class Cart(Base):
     __tablename__ = "carts"
@@ -37,7 +57,7 @@ class Cart(Base):
     user = relationship("User", back_populates="carts")
 
     # Relationship with cart items
-    cart_items = relationship("CartItem", back_populates="cart")
+    cart_items = relationship("CartItem", back_populates="cart", passive_deletes=True)
 
 
 class CartItem(Base):
@@ -63,6 +83,11 @@ class Category(Base):
     # Relationship with products
     products = relationship("Product", back_populates="category")
 
+    # Trigram index backing the category name search
+    __table_args__ = (
+        Index("ix_categories_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+    )
+
 
 class Product(Base):
     __tablename__ = "products"
@@ -79,9 +104,24 @@ class Product(Base):
     images = Column(ARRAY(String), nullable=False)
     is_published = Column(Boolean, server_default="True", nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=text("NOW()"), nullable=False)
-    embedding = Column(Vector(384), nullable=False)
+    # Deferred: only embedding refreshes and similarity features read the vector
+    embedding = deferred(Column(Vector(EMBEDDING_DIM), nullable=False))
+    # SHA-256 of the embedded text, see product_embedding_hash
+    embedding_hash = deferred(Column(String(64), nullable=True))
+    # PCA projection of the embedding and the EmbeddingProjection version it was made with
+    embedding_reduced = deferred(Column(Vector(), nullable=True))
+    embedding_reduced_version = deferred(Column(Integer, nullable=True))
     comments = Column(ARRAY(String), nullable=True)
 
+    # Full-text document over title, brand and description, maintained by Postgres
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(brand, '') || ' ' || coalesce(description, ''))",
+            persisted=True
+        )
+    ))
+
     # Relationship with category
     category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False)
     category = relationship("Category", back_populates="products")
@@ -90,6 +130,15 @@ class Product(Base):
     cart_items = relationship("CartItem", back_populates="product")
     comments = relationship("Comment", back_populates="product")
 
+    # Composite indexes backing keyset pagination on the sortable columns
+    __table_args__ = (
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_rating_id", "rating", "id"),
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -100,8 +149,127 @@ class Comment(Base):
     content = Column(String, nullable=False)
     rating = Column(Float, nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=text("NOW()"), nullable=False)
-    sentiment_score = Column(Float, nullable=False)
-    sentiment_label = Column(String, nullable=False)
+    # Filled in by app.sentiment_worker, NULL while the comment is pending
+    sentiment_score = Column(Float, nullable=True)
+    sentiment_label = Column(String, nullable=True)
+    # pending | done | failed (after SENTIMENT_MAX_ATTEMPTS failed classifications)
+    sentiment_status = Column(String, server_default="pending", nullable=False)
+    sentiment_attempts = Column(Integer, server_default="0", nullable=False)
 
     product = relationship("Product", back_populates="comments")
     user = relationship("User", back_populates="comments")
+
+    __table_args__ = (
+        # The sentiment queue: only the comments still to be classified are indexed
+        Index("ix_comments_sentiment_queue", "sentiment_status", "id", postgresql_where=text("sentiment_status IN ('pending', 'failed')")),
+    )
+
+
+class CommentAggregate(Base):
+    __tablename__ = "comment_aggregates"
+
+    # Running totals of a product's comments, kept in step by app.comment_aggregates
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    comment_count = Column(Integer, server_default="0", nullable=False)
+    rating_sum = Column(Float, server_default="0", nullable=False)
+    # Only comments the sentiment worker has classified
+    classified_count = Column(Integer, server_default="0", nullable=False)
+    sentiment_score_sum = Column(Float, server_default="0", nullable=False)
+    label_counts = Column(JSONB, server_default=text("'{}'::jsonb"), nullable=False)
+
+
+class CommentSummary(Base):
+    __tablename__ = "comment_summaries"
+
+    # Stored AI summary of a product's comments, see app.comment_summaries
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    summary = Column(String, nullable=False)
+    # Watermark: comments up to this id are in the summary
+    last_comment_id = Column(Integer, nullable=False)
+    comment_count = Column(Integer, nullable=False)
+    # Bumped by every comment edit or delete, a summary built from an older generation is not saved
+    generation = Column(Integer, server_default=text("0"), nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=text("NOW()"), nullable=False)
+
+
+class LLMResponse(Base):
+    __tablename__ = "llm_response_cache"
+
+    # Gemini responses keyed by model and prompt SHA-256, see app.llm_cache
+    model = Column(String, primary_key=True, nullable=False)
+    prompt_hash = Column(String(64), primary_key=True, nullable=False)
+    response = Column(String, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=text("NOW()"), nullable=False)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # Size bounded eviction drops the oldest entries first
+        Index("ix_llm_response_cache_created_at", "created_at"),
+        Index("ix_llm_response_cache_expires_at", "expires_at"),
+    )
+
+
+class EmbeddingProjection(Base):
+    __tablename__ = "embedding_projections"
+
+    # Fitted PCA projections, the highest activated version is the one search uses
+    version = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
+    dim = Column(Integer, nullable=False)
+    # float32 bytes, components is dim x EMBEDDING_DIM and mean EMBEDDING_DIM
+    components = Column(LargeBinary, nullable=False)
+    mean = Column(LargeBinary, nullable=False)
+    explained_variance = Column(Float, nullable=False)
+    sample_size = Column(Integer, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=text("NOW()"), nullable=False)
+    # Set once every product is projected with this version
+    activated_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+
+class ProductNeighbour(Base):
+    __tablename__ = "product_neighbours"
+
+    # Precomputed most similar products by embedding, see app.neighbours
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    neighbour_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    score = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_product_neighbours_product_id_score", "product_id", "score"),
+        # Deletes and re-embeds remove the product from the other products' lists
+        Index("ix_product_neighbours_neighbour_id", "neighbour_id"),
+    )
+
+
+if EMBEDDING_STORAGE not in EMBEDDING_STORAGES:
+    raise ValueError(f"Unknown EMBEDDING_STORAGE: {EMBEDDING_STORAGE}, expected one of {', '.join(EMBEDDING_STORAGES)}")
+
+# The quantized variants are expression indexes over the float32 column, so
+# only the index shrinks and exact distances stay available for re-ranking.
+if EMBEDDING_STORAGE == "halfvec":
+    Index(
+        "ix_products_embedding_halfvec_hnsw", cast(Product.__table__.c.embedding, HALFVEC(EMBEDDING_DIM)).label("embedding"),
+        postgresql_using="hnsw",
+        postgresql_with={"m": 16, "ef_construction": 64},
+        postgresql_ops={"embedding": "halfvec_cosine_ops"}
+    )
+elif EMBEDDING_STORAGE == "binary":
+    Index(
+        "ix_products_embedding_binary_hnsw", cast(func.binary_quantize(Product.__table__.c.embedding), BIT(EMBEDDING_DIM)).label("embedding"),
+        postgresql_using="hnsw",
+        postgresql_with={"m": 16, "ef_construction": 64},
+        postgresql_ops={"embedding": "bit_hamming_ops"}
+    )
+elif EMBEDDING_STORAGE == "pca":
+    Index(
+        "ix_products_embedding_pca_hnsw", cast(Product.__table__.c.embedding_reduced, Vector(EMBEDDING_PCA_DIM)).label("embedding_reduced"),
+        postgresql_using="hnsw",
+        postgresql_with={"m": 16, "ef_construction": 64},
+        postgresql_ops={"embedding_reduced": "vector_cosine_ops"}
+    )
+else:
+    Index(
+        "ix_products_embedding_hnsw", Product.__table__.c.embedding,
+        postgresql_using="hnsw",
+        postgresql_with={"m": 16, "ef_construction": 64},
+        postgresql_ops={"embedding": "vector_cosine_ops"}
+    )
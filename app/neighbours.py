@@ -0,0 +1,190 @@
+"""
+Precomputed "similar products": the NEIGHBOURS_K most similar products of every product.
+
+    python -m app.neighbours
+    python -m app.neighbours --batch-size 4096
+
+Rebuilds the whole product_neighbours table (also POST /admin/neighbours).
+Between rebuilds the table is refreshed incrementally as products are
+created, re-embedded or deleted.
+"""
+import argparse
+import os
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import List, Tuple
+from app.database import SessionLocal
+from app.jobs import BackgroundJob
+from app.models import EMBEDDING_STORAGE, Product
+from app.reduction import get_projection
+from app.vector_index import VECTOR_INDEX_DTYPE, VectorIndex
+from app.vector_search import PRODUCT_COLUMNS, embedding_params, nearest_sql, rerank_limit, row_to_product, set_search_params
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
+
+NEIGHBOURS_K = int(os.getenv('NEIGHBOURS_K', '20'))
+# Memory for the scores of one rebuild batch, large catalogs get smaller batches
+NEIGHBOURS_MEMORY_MB = int(os.getenv('NEIGHBOURS_MEMORY_MB', '256'))
+
+# Rows of products deleted while they were being computed are skipped
+INSERT_NEIGHBOURS = text("""
+    INSERT INTO product_neighbours (product_id, neighbour_id, score)
+    SELECT rows.product_id, rows.neighbour_id, rows.score
+    FROM unnest(CAST(:product_ids AS integer[]), CAST(:neighbour_ids AS integer[]), CAST(:scores AS float8[]))
+        AS rows(product_id, neighbour_id, score)
+    JOIN products ON products.id = rows.product_id
+    JOIN products AS neighbours ON neighbours.id = rows.neighbour_id
+    ON CONFLICT (product_id, neighbour_id) DO UPDATE SET score = EXCLUDED.score
+""")
+
+
+def insert_neighbours(db: Session, rows: List[Tuple[int, int, float]]):
+    if not rows:
+        return
+
+    product_ids, neighbour_ids, scores = zip(*rows)
+    db.execute(INSERT_NEIGHBOURS, {
+        "product_ids": list(product_ids),
+        "neighbour_ids": list(neighbour_ids),
+        "scores": list(scores)
+    })
+
+
+def get_similar_products(db: Session, product_id: int, limit: int) -> Tuple[List[dict], List[dict]]:
+    """
+    Published products most similar to `product_id`, from the precomputed table.
+
+    Returns:
+        Tuple: Product dicts shaped like ProductBase, most similar first, and their scores.
+    """
+    result = db.execute(text(f"""
+        SELECT
+            {PRODUCT_COLUMNS},
+            categories.name AS category_name,
+            product_neighbours.score
+        FROM product_neighbours
+        JOIN products ON product_neighbours.neighbour_id = products.id
+        JOIN categories ON products.category_id = categories.id
+        WHERE product_neighbours.product_id = :product_id
+            AND products.is_published
+        ORDER BY product_neighbours.score DESC, products.id
+        LIMIT :limit
+    """), {"product_id": product_id, "limit": limit}).mappings().all()
+
+    products = [row_to_product(row) for row in result]
+    scores = [
+        {"product_id": row["id"], "score": row["score"], "semantic_rank": rank, "distance": 1 - row["score"]}
+        for rank, row in enumerate(result, start=1)
+    ]
+    return products, scores
+
+
+def refresh_product_neighbours(product_id: int):
+    """
+    Recompute the neighbours of one product after it was created or re-embedded, run as a background task.
+
+    The product's own list comes from the HNSW index. The product is also
+    offered to each of those neighbours' lists, which are trimmed back to
+    NEIGHBOURS_K; lists it dropped out of only shrink until the next rebuild.
+    With pca storage and no activated projection yet there is no index to
+    search, the product gets its neighbours from the next rebuild instead.
+    """
+    db = SessionLocal()
+    try:
+        embedding = db.query(Product.embedding).\
+            filter(Product.id == product_id).\
+            scalar()
+
+        if embedding is None:
+            return
+
+        # embedding_params would raise an HTTPException, which only ends as a traceback in a background task
+        if EMBEDDING_STORAGE == "pca" and get_projection(db) is None:
+            print(f"Neighbours of product {product_id} not refreshed: no embedding projection activated, run python -m app.reduction fit")
+            return
+
+        set_search_params(db, limit=rerank_limit(NEIGHBOURS_K))
+        nearest = db.execute(text(nearest_sql("products.id", "products.id != :product_id", ":limit")), {
+            **embedding_params(db, embedding),
+            "product_id": product_id,
+            "limit": NEIGHBOURS_K,
+            "rerank_limit": rerank_limit(NEIGHBOURS_K)
+        }).all()
+
+        db.execute(text("DELETE FROM product_neighbours WHERE product_id = :product_id OR neighbour_id = :product_id"), {
+            "product_id": product_id
+        })
+        insert_neighbours(db, [(product_id, row.id, 1 - row.distance) for row in nearest])
+        insert_neighbours(db, [(row.id, product_id, 1 - row.distance) for row in nearest])
+
+        db.execute(text("""
+            DELETE FROM product_neighbours
+            USING (
+                SELECT
+                    product_id,
+                    neighbour_id,
+                    row_number() OVER (PARTITION BY product_id ORDER BY score DESC, neighbour_id) AS rank
+                FROM product_neighbours
+                WHERE product_id = ANY(:product_ids)
+            ) AS ranked
+            WHERE product_neighbours.product_id = ranked.product_id
+                AND product_neighbours.neighbour_id = ranked.neighbour_id
+                AND ranked.rank > :k
+        """), {"product_ids": [row.id for row in nearest], "k": NEIGHBOURS_K})
+
+        db.commit()
+    finally:
+        db.close()
+
+
+class NeighboursJob(BackgroundJob):
+    """
+    Exact rebuild of the whole table from an in-memory matrix of all embeddings.
+
+    Products are scored a batch at a time against the full matrix and each
+    batch's lists are replaced and committed on their own, so the table is
+    never empty while the rebuild runs.
+    """
+
+    name = "neighbours-job"
+
+    def initial_status(self, batch_size: int = 0) -> dict:
+        return super().initial_status(batch_size=batch_size, k=NEIGHBOURS_K)
+
+    def run(self, batch_size: int = 1024):
+        db = SessionLocal()
+        try:
+            index = VectorIndex(dtype=VECTOR_INDEX_DTYPE)
+            index.build((row.id, row.embedding) for row in db.query(Product.id, Product.embedding).yield_per(10000))
+            self._update(total=len(index))
+
+            for product_ids, neighbour_ids, similarities in index.all_neighbours(NEIGHBOURS_K, batch_size, memory_bytes=NEIGHBOURS_MEMORY_MB * 2 ** 20):
+                db.execute(text("DELETE FROM product_neighbours WHERE product_id = ANY(:product_ids)"), {
+                    "product_ids": product_ids.tolist()
+                })
+                insert_neighbours(db, [
+                    (int(product_id), int(neighbour_id), float(similarity))
+                    for product_id, neighbours, scores in zip(product_ids, neighbour_ids, similarities)
+                    for neighbour_id, similarity in zip(neighbours, scores)
+                ])
+                db.commit()
+                self._advance(processed=len(product_ids))
+        finally:
+            db.close()
+
+
+neighbours_job = NeighboursJob()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the precomputed similar products table.")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    neighbours_job.execute(batch_size=args.batch_size)
+    status = neighbours_job.status()
+    print(f"{status['state']}: neighbours of {status['processed']} of {status['total']} products rebuilt")
+    if status["error"]:
+        print(status["error"])
@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(payload: dict) -> str:
+    """
+    Encode a keyset position into an opaque, URL-safe cursor string.
+
+    Args:
+        payload (dict): JSON serializable position of the last returned row.
+
+    Returns:
+        str: Opaque cursor to be handed back by the client as `cursor`.
+    """
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor!"
+        )
+
+    if not isinstance(payload, dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor!"
+        )
+    return payload
+
+
+def parse_cursor_value(column, value: Any) -> Optional[Any]:
+    """
+    Convert a JSON decoded cursor value back to the python type of the sort column.
+    """
+    if value is None:
+        return None
+
+    try:
+        python_type = column.type.python_type
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        return python_type(value)
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor!"
+        )
+
+
+def keyset_filter(sort_column, id_column, sort_value: Any, last_id: int, descending: bool = False):
+    """
+    Build the WHERE clause that continues a `(sort_column, id)` ordered scan after the given row.
+
+    Written as an expanded OR instead of a row comparison so the planner can
+    use a composite `(sort_column, id)` index in both directions.
+    """
+    if sort_column is id_column:
+        return id_column < last_id if descending else id_column > last_id
+
+    if descending:
+        return or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, id_column < last_id)
+        )
+    return or_(
+        sort_column > sort_value,
+        and_(sort_column == sort_value, id_column > last_id)
+    )
@@ -0,0 +1,138 @@
+"""
+Check that product, cart, comment and user reads issue a fixed number of queries.
+
+    python -m app.query_check
+    python -m app.query_check --limits 1 10 100
+
+Runs the product, cart, comment and user list endpoints with every page
+size in `--limits`, and the cart and account endpoints for the carts and
+users with the fewest and the most rows below them. Each result is
+serialized through its response schema as FastAPI does and the statements
+executed are counted. The count must not grow with the page size or the
+number of items in a cart or carts of a user; the check exits non-zero
+when it does, so it can run in CI against a seeded database.
+"""
+import argparse
+import sys
+from sqlalchemy import func
+from app.database import SessionLocal, count_queries
+from app.models import Cart, CartItem, Comment, User
+from app.routers.accounts import get_my_info
+from app.routers.carts import get_all_carts, get_cart
+from app.routers.comments import get_product_comments
+from app.routers.products import get_all_products
+from app.routers.users import get_all_users
+from app.schemas.accounts import AccountOut
+from app.schemas.carts import CartOut, CartsOutList
+from app.schemas.comments import CommentsOut
+from app.schemas.products import ProductsOut
+from app.schemas.users import UsersOut
+
+
+def counted(read) -> int:
+    """
+    Statements executed by `read(db)` on a fresh session, serialization included.
+    """
+    db = SessionLocal()
+    try:
+        with count_queries() as statements:
+            read(db)
+        return len(statements)
+    finally:
+        db.close()
+
+
+def fixed_counts(name: str, reads: dict) -> bool:
+    """
+    Count each of `reads` (label -> read), print the counts and tell whether they are all equal.
+    """
+    counts = [counted(read) for read in reads.values()]
+    print(f"{name}: " + ", ".join(f"{label} {count} queries" for label, count in zip(reads, counts)))
+    return len(set(counts)) <= 1
+
+
+def check(limits: list) -> bool:
+    db = SessionLocal()
+    try:
+        # The users with the fewest and the most carts, the carts with the fewest and the most items
+        # and the product with the most comments, so the counts cover many rows
+        cart_counts = db.query(User, func.count(Cart.id)).\
+            join(Cart).\
+            group_by(User.id).\
+            order_by(func.count(Cart.id)).\
+            all()
+        users = cart_counts[:1] + cart_counts[-1:]
+        item_counts = db.query(Cart, func.count(CartItem.id)).\
+            join(CartItem).\
+            group_by(Cart.id).\
+            order_by(func.count(CartItem.id)).\
+            all()
+        carts = [(cart.id, cart.user, items) for cart, items in (item_counts[:1] + item_counts[-1:])]
+        product_id = db.query(Comment.product_id).\
+            group_by(Comment.product_id).\
+            order_by(func.count(Comment.id).desc()).\
+            limit(1).\
+            scalar()
+    finally:
+        db.close()
+
+    user = users[-1][0] if users else None
+    if user is None:
+        print("No carts, skipping the cart and user reads")
+
+    fixed = fixed_counts("GET /products", {
+        f"limit={limit}": lambda db, limit=limit: ProductsOut.model_validate(get_all_products(
+            search="", page=1, limit=limit, cursor=None, sort_by=None, order=None, fields=None, db=db, current_user=user
+        ), from_attributes=True)
+        for limit in limits
+    })
+
+    if product_id is not None:
+        fixed = fixed_counts(f"GET /products/{product_id}/comments", {
+            f"limit={limit}": lambda db, limit=limit: CommentsOut.model_validate(get_product_comments(
+                product_id=product_id, page=1, limit=limit, db=db, current_user=user
+            ), from_attributes=True)
+            for limit in limits
+        }) and fixed
+    else:
+        print("No comments, skipping the comment reads")
+
+    if user is not None:
+        fixed = fixed_counts("GET /carts", {
+            f"limit={limit}": lambda db, limit=limit: CartsOutList.model_validate(get_all_carts(
+                page=1, limit=limit, db=db, current_user=user
+            ), from_attributes=True)
+            for limit in limits
+        }) and fixed
+        fixed = fixed_counts("GET /carts/{cart_id}", {
+            f"cart {cart_id} ({items} items)": lambda db, cart_id=cart_id, owner=owner: CartOut.model_validate(get_cart(
+                cart_id=cart_id, db=db, current_user=owner
+            ), from_attributes=True)
+            for cart_id, owner, items in carts
+        }) and fixed
+        # Users of the role with the most carts, so the listed users have carts
+        fixed = fixed_counts("GET /users", {
+            f"limit={limit}": lambda db, limit=limit: UsersOut.model_validate(get_all_users(
+                search="", role=user.role, page=1, limit=limit, db=db, current_user=user
+            ), from_attributes=True)
+            for limit in limits
+        }) and fixed
+        fixed = fixed_counts("GET /me", {
+            f"user {account.id} ({account_carts} carts)": lambda db, account=account: AccountOut.model_validate(get_my_info(
+                db=db, current_user=account
+            ), from_attributes=True)
+            for account, account_carts in users
+        }) and fixed
+
+    return fixed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that product, cart, comment and user reads issue a fixed number of queries.")
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    if not check(args.limits):
+        print("Query counts depend on the number of rows, a relationship is loaded lazily")
+        sys.exit(1)
+    print("Query counts are fixed")
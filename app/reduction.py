@@ -0,0 +1,208 @@
+"""
+PCA projection of the product embeddings to EMBEDDING_PCA_DIM dimensions.
+
+    python -m app.reduction fit
+    python -m app.reduction fit --sample-size 200000
+    python -m app.reduction apply
+
+`fit` fits a new projection version on a sample of the catalog, projects every
+product with it, activates it and builds the HNSW index on the reduced
+vectors. `apply` only projects the products not yet projected with the active
+version. Search uses the active projection with EMBEDDING_STORAGE=pca and
+only compares products projected with that same version, so products already
+re-projected by a running `fit` are left out of the results until it activates
+the new version.
+"""
+import argparse
+import threading
+import time
+import numpy as np
+from sqlalchemy import func, or_, text
+from sqlalchemy.orm import Session
+from typing import NamedTuple, Optional, Tuple
+from app.database import SessionLocal, engine
+from app.models import EMBEDDING_DIM, EMBEDDING_PCA_DIM, EMBEDDING_STORAGE, EmbeddingProjection, Product
+
+# API workers pick up a projection fitted by another process within this many seconds
+PROJECTION_REFRESH_SECONDS = 60
+
+
+class Projection(NamedTuple):
+    version: int
+    components: np.ndarray
+    mean: np.ndarray
+
+
+def project(projection: Projection, embeddings) -> np.ndarray:
+    """
+    Project embeddings, shape (n, EMBEDDING_DIM), and normalize them for cosine distance.
+    """
+    reduced = (np.asarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM) - projection.mean) @ projection.components.T
+    norm = np.linalg.norm(reduced, axis=1, keepdims=True)
+    return reduced / np.where(norm == 0, 1, norm)
+
+
+def to_projection(row: EmbeddingProjection) -> Projection:
+    return Projection(
+        version=row.version,
+        components=np.frombuffer(row.components, dtype=np.float32).reshape(row.dim, EMBEDDING_DIM),
+        mean=np.frombuffer(row.mean, dtype=np.float32)
+    )
+
+
+_projection = None
+_loaded_at = 0.0
+_projection_lock = threading.Lock()
+
+
+def get_projection(db: Session) -> Optional[Projection]:
+    """
+    Latest activated projection, cached for PROJECTION_REFRESH_SECONDS.
+    """
+    global _projection, _loaded_at
+
+    with _projection_lock:
+        if time.monotonic() - _loaded_at > PROJECTION_REFRESH_SECONDS:
+            row = db.query(EmbeddingProjection).\
+                filter(EmbeddingProjection.dim == EMBEDDING_PCA_DIM).\
+                filter(EmbeddingProjection.activated_at.isnot(None)).\
+                order_by(EmbeddingProjection.version.desc()).\
+                first()
+            _projection = to_projection(row) if row else None
+            _loaded_at = time.monotonic()
+        return _projection
+
+
+def reduce_embedding(db: Session, embedding) -> Tuple[Optional[list], Optional[int]]:
+    """
+    Reduced embedding of a product and the projection version, both None unless EMBEDDING_STORAGE is pca.
+    """
+    if EMBEDDING_STORAGE != "pca":
+        return None, None
+
+    projection = get_projection(db)
+    if projection is None:
+        return None, None
+    return project(projection, embedding)[0].tolist(), projection.version
+
+
+def fit_projection(db: Session, sample_size: int) -> Projection:
+    """
+    Fit PCA to EMBEDDING_PCA_DIM dimensions on a random sample of the product embeddings.
+
+    The new version is not used by search until `activate_projection`.
+    """
+    from sklearn.decomposition import PCA
+
+    sample = np.asarray([
+        row.embedding for row in db.query(Product.embedding).order_by(func.random()).limit(sample_size)
+    ], dtype=np.float32)
+
+    if len(sample) < EMBEDDING_PCA_DIM:
+        raise ValueError(f"Fitting {EMBEDDING_PCA_DIM} components needs at least as many products, found {len(sample)}")
+
+    pca = PCA(n_components=EMBEDDING_PCA_DIM).fit(sample)
+
+    row = EmbeddingProjection(
+        dim=EMBEDDING_PCA_DIM,
+        components=pca.components_.astype(np.float32).tobytes(),
+        mean=pca.mean_.astype(np.float32).tobytes(),
+        explained_variance=float(pca.explained_variance_ratio_.sum()),
+        sample_size=len(sample)
+    )
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+
+    print(f"Fitted projection version {row.version}: {EMBEDDING_PCA_DIM} dims, {row.explained_variance:.2%} of the variance of {len(sample)} products")
+    return to_projection(row)
+
+
+def apply_projection(db: Session, projection: Projection, batch_size: int = 1000) -> int:
+    """
+    Project every product not yet projected with `projection`, in id order one batch at a time.
+
+    Returns:
+        int: Number of products projected.
+    """
+    last_id, projected = 0, 0
+    while True:
+        rows = db.query(Product.id, Product.embedding).\
+            filter(Product.id > last_id).\
+            filter(or_(Product.embedding_reduced_version.is_(None), Product.embedding_reduced_version != projection.version)).\
+            order_by(Product.id).\
+            limit(batch_size).\
+            all()
+
+        if not rows:
+            return projected
+        last_id = rows[-1].id
+
+        reduced = project(projection, [row.embedding for row in rows])
+        db.bulk_update_mappings(Product, [
+            {"id": row.id, "embedding_reduced": vector.tolist(), "embedding_reduced_version": projection.version}
+            for row, vector in zip(rows, reduced)
+        ])
+        db.commit()
+        projected += len(rows)
+
+
+def activate_projection(db: Session, projection: Projection):
+    """
+    Make search use `projection`, once `apply_projection` projected every product with it.
+
+    API workers switch within PROJECTION_REFRESH_SECONDS.
+    """
+    db.query(EmbeddingProjection).\
+        filter(EmbeddingProjection.version == projection.version).\
+        update({EmbeddingProjection.activated_at: func.now()}, synchronize_session=False)
+    db.commit()
+
+
+def create_index():
+    """
+    Build the HNSW index on the reduced vectors, matching app.models, without blocking writes.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_embedding_pca_hnsw
+            ON products USING hnsw ((CAST(embedding_reduced AS vector({EMBEDDING_PCA_DIM}))) vector_cosine_ops)
+            WITH (m = 16, ef_construction = 64)
+        """))
+
+
+def drop_index():
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_products_embedding_pca_hnsw"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit and apply the PCA projection of the product embeddings.")
+    parser.add_argument("command", choices=("fit", "apply"))
+    parser.add_argument("--sample-size", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "fit":
+            previous = db.query(EmbeddingProjection.dim).\
+                order_by(EmbeddingProjection.version.desc()).\
+                first()
+            # The index casts to a fixed dimension, rows of another dimension cannot be indexed by it
+            if previous is not None and previous.dim != EMBEDDING_PCA_DIM:
+                drop_index()
+            projection = fit_projection(db, args.sample_size)
+            print(f"Projected {apply_projection(db, projection, args.batch_size)} products with version {projection.version}")
+            activate_projection(db, projection)
+            print(f"Activated projection version {projection.version}")
+        else:
+            projection = get_projection(db)
+            if projection is None:
+                raise SystemExit(f"No {EMBEDDING_PCA_DIM} dimensional projection activated yet, run: python -m app.reduction fit")
+
+        # After an activation: products created meanwhile were still projected with the previous version
+        print(f"Projected {apply_projection(db, projection, args.batch_size)} products with version {projection.version}")
+        create_index()
+    finally:
+        db.close()
@@ -0,0 +1,155 @@
+"""
+Re-embed products whose embedded text changed since their embedding was computed.
+
+    python -m app.reembed
+    python -m app.reembed --force --batch-size 500
+
+Also started from the API with POST /admin/reembed.
+"""
+import argparse
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.jobs import BackgroundJob
+from app.models import Product
+from app.huggingface import embed_products, product_embedding_hash
+from app.vector_index import index_product
+from app.reduction import reduce_embedding
+from app.neighbours import refresh_product_neighbours
+
+
+def save_embedding(db: Session, product_id: int, title: str, description: str, brand: str, embedding: list) -> bool:
+    """
+    Store the embedding computed from `title`, `description` and `brand`, unless the product's text changed since.
+
+    The text is checked by the UPDATE itself, after any concurrent edit of
+    the row committed. A task that embedded an older text and commits last
+    must not overwrite the embedding of the newer text, whose hash would then
+    match and keep the stale embedding forever.
+
+    Returns:
+        bool: Whether the product was updated, commit to keep it.
+    """
+    reduced, version = reduce_embedding(db, embedding)
+    result = db.execute(
+        update(Product).
+        where(
+            Product.id == product_id,
+            Product.title == title,
+            Product.description == description,
+            Product.brand == brand
+        ).
+        values(
+            embedding=embedding,
+            embedding_hash=product_embedding_hash(title, description, brand),
+            embedding_reduced=reduced,
+            embedding_reduced_version=version
+        ).
+        execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def reembed_product(product_id: int):
+    """
+    Re-embed one product if its embedded text changed, run as a background task after updates.
+
+    The hash is recomputed from the current row, so repeated or outdated
+    tasks for the same product are no-ops, and a task whose text was edited
+    again while embedding leaves the row to the newer task.
+    """
+    db = SessionLocal()
+    try:
+        product = db.query(Product).\
+            filter(Product.id == product_id).\
+            first()
+
+        if not product:
+            return
+
+        content_hash = product_embedding_hash(product.title, product.description, product.brand)
+        if content_hash == product.embedding_hash:
+            return
+
+        embedding = embed_products([(product.title, product.description, product.brand)])[0]
+        if not save_embedding(db, product_id, product.title, product.description, product.brand, embedding):
+            db.rollback()
+            return
+        db.commit()
+
+        index_product(product_id, embedding)
+    finally:
+        db.close()
+
+    refresh_product_neighbours(product_id)
+
+
+class ReembedJob(BackgroundJob):
+    """
+    Catalog wide re-embed, walking the products in id order one batch at a time.
+
+    Each batch is embedded together and committed on its own, so progress
+    survives a crash and a rerun skips what is already up to date.
+    """
+
+    name = "reembed-job"
+
+    def initial_status(self, batch_size: int = 0, force: bool = False) -> dict:
+        return super().initial_status(batch_size=batch_size, force=force, reembedded=0, last_product_id=None)
+
+    def run(self, batch_size: int = 256, force: bool = False):
+        db = SessionLocal()
+        try:
+            self._update(total=db.query(func.count(Product.id)).scalar())
+
+            last_id = 0
+            while True:
+                rows = db.query(Product.id, Product.title, Product.description, Product.brand, Product.embedding_hash).\
+                    filter(Product.id > last_id).\
+                    order_by(Product.id).\
+                    limit(batch_size).\
+                    all()
+
+                if not rows:
+                    break
+                last_id = rows[-1].id
+
+                stale = [
+                    row for row in rows
+                    if force or product_embedding_hash(row.title, row.description, row.brand) != row.embedding_hash
+                ]
+
+                saved = []
+                if stale:
+                    embeddings = embed_products([(row.title, row.description, row.brand) for row in stale])
+                    # Products edited since the batch was read are left to their own reembed_product task
+                    saved = [
+                        (row.id, embedding)
+                        for row, embedding in zip(stale, embeddings)
+                        if save_embedding(db, row.id, row.title, row.description, row.brand, embedding)
+                    ]
+                    db.commit()
+
+                    for product_id, embedding in saved:
+                        index_product(product_id, embedding)
+
+                self._advance(processed=len(rows), reembedded=len(saved))
+                self._update(last_product_id=last_id)
+        finally:
+            db.close()
+
+
+reembed_job = ReembedJob()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-embed products whose title, description or brand changed.")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--force", action="store_true", help="Re-embed every product, not only the changed ones")
+    args = parser.parse_args()
+
+    reembed_job.execute(batch_size=args.batch_size, force=args.force)
+    status = reembed_job.status()
+    print(f"{status['state']}: {status['reembedded']} of {status['processed']} products re-embedded")
+    if status["error"]:
+        print(status["error"])
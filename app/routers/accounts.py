@@ -3,6 +3,7 @@ from app.database import get_db
 from app.oauth2 import get_current_user
 from app.schemas.accounts import AccountUpdate, AccountOut
 from app.models import User
+from app.loaders import USER_LOADER
 from app.utils import hash
 from sqlalchemy.orm import Session
 
@@ -13,15 +14,27 @@ router = APIRouter(
 )
 
 
+def get_loaded_account(db: Session, user_id: int) -> User:
+    """
+    Load the account with its carts, cart items, products and categories in place for serialization.
+    """
+    return db.query(User).\
+        options(USER_LOADER).\
+        filter(User.id == user_id).\
+        populate_existing().\
+        one()
+
+
 @router.get(
     path="/",
     status_code=status.HTTP_200_OK,
     response_model=AccountOut
 )
 def get_my_info(
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return current_user
+    return get_loaded_account(db, current_user.id)
 
 
 @router.put(
@@ -50,9 +63,8 @@ def edit_my_info(
     current_user.password = hash(updated_user.password)
 
     db.commit()
-    db.refresh(current_user)
 
-    return current_user
+    return get_loaded_account(db, current_user.id)
 
 
 @router.delete(
@@ -0,0 +1,146 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.oauth2 import get_admin_user
+from app.models import User
+from app.schemas.admin import CacheStatsOut, InferenceStatsOut, WarmupOut, ReembedStatusOut, NeighboursStatusOut, SentimentQueueOut, LLMStatsOut
+from app.search_cache import query_cache
+from app.huggingface import embedding_batcher, sentiment_batcher
+from app.model_client import MODEL_SERVER_SOCKET, get_model_client
+from app.warmup import warmup_all
+from app.reembed import reembed_job
+from app.neighbours import neighbours_job
+from app.sentiment_worker import queue_stats
+from app.llm import llm_client
+from app.llm_cache import llm_response_cache
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"]
+)
+
+
+@router.get(
+    path="/cache_stats",
+    status_code=status.HTTP_200_OK,
+    response_model=CacheStatsOut
+)
+def get_cache_stats(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_admin_user)
+):
+    return {
+        "query_cache": query_cache.stats(),
+        "llm_cache": llm_response_cache.stats(db)
+    }
+
+
+@router.get(
+    path="/inference_stats",
+    status_code=status.HTTP_200_OK,
+    response_model=InferenceStatsOut
+)
+def get_inference_stats(
+    current_user: User = Depends(get_admin_user)
+):
+    if MODEL_SERVER_SOCKET:
+        return get_model_client().call("stats", None)
+
+    return {
+        "embedding": embedding_batcher.stats(),
+        "sentiment": sentiment_batcher.stats()
+    }
+
+
+@router.get(
+    path="/llm_stats",
+    status_code=status.HTTP_200_OK,
+    response_model=LLMStatsOut
+)
+def get_llm_stats(
+    current_user: User = Depends(get_admin_user)
+):
+    return llm_client.stats()
+
+
+@router.post(
+    path="/warmup",
+    status_code=status.HTTP_200_OK,
+    response_model=WarmupOut
+)
+def warmup_models(
+    current_user: User = Depends(get_admin_user)
+):
+    return {"seconds": warmup_all()}
+
+
+@router.post(
+    path="/reembed",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=ReembedStatusOut
+)
+def start_reembed(
+    batch_size: int = Query(default=256, ge=1, le=10000),
+    force: bool = False,
+    current_user: User = Depends(get_admin_user)
+):
+    if not reembed_job.start(batch_size=batch_size, force=force):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A re-embed job is already running!"
+        )
+
+    return reembed_job.status()
+
+
+@router.get(
+    path="/reembed",
+    status_code=status.HTTP_200_OK,
+    response_model=ReembedStatusOut
+)
+def get_reembed_status(
+    current_user: User = Depends(get_admin_user)
+):
+    return reembed_job.status()
+
+
+@router.post(
+    path="/neighbours",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=NeighboursStatusOut
+)
+def start_neighbours_rebuild(
+    batch_size: int = Query(default=1024, ge=1, le=65536),
+    current_user: User = Depends(get_admin_user)
+):
+    if not neighbours_job.start(batch_size=batch_size):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A similar products rebuild is already running!"
+        )
+
+    return neighbours_job.status()
+
+
+@router.get(
+    path="/neighbours",
+    status_code=status.HTTP_200_OK,
+    response_model=NeighboursStatusOut
+)
+def get_neighbours_rebuild_status(
+    current_user: User = Depends(get_admin_user)
+):
+    return neighbours_job.status()
+
+
+@router.get(
+    path="/sentiment_queue",
+    status_code=status.HTTP_200_OK,
+    response_model=SentimentQueueOut
+)
+def get_sentiment_queue(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_admin_user)
+):
+    return queue_stats(db)
@@ -3,8 +3,11 @@ from app.schemas.carts import CartsOutList, CartOut, CartCreate, CartUpdate
 from app.database import get_db
 from app.oauth2 import get_current_user
 from app.models import User, Cart, Product, CartItem
+from app.loaders import CART_LOADER
+from app.copurchase import record_cart
 from sqlalchemy import asc
 from sqlalchemy.orm import Session
+from typing import Dict, List
 
 
 router = APIRouter(
@@ -13,6 +16,38 @@ router = APIRouter(
 )
 
 
+def get_cart_products(db: Session, product_ids: List[int]) -> Dict[int, Product]:
+    """
+    Fetch every product referenced by a cart payload with a single query.
+
+    Raises:
+        HTTPException: 404 for the first product id that does not exist.
+    """
+    products = db.query(Product).\
+        filter(Product.id.in_(set(product_ids))).\
+        all()
+    products_by_id = {product.id: product for product in products}
+
+    for product_id in product_ids:
+        if product_id not in products_by_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Product with id: {product_id} does not exist!"
+            )
+    return products_by_id
+
+
+def get_loaded_cart(db: Session, cart_id: int) -> Cart:
+    """
+    Reload a cart after commit with its items, products and categories in place for serialization.
+    """
+    return db.query(Cart).\
+        options(CART_LOADER).\
+        filter(Cart.id == cart_id).\
+        populate_existing().\
+        one()
+
+
 @router.get(
     path="/",
     status_code=status.HTTP_200_OK,
@@ -25,6 +60,7 @@ def get_all_carts(
     current_user: User = Depends(get_current_user)
 ):
     cards = db.query(Cart).\
+        options(CART_LOADER).\
         filter(Cart.user_id == current_user.id).\
         order_by(asc(Cart.id)).\
         offset((page - 1) * limit).\
@@ -43,6 +79,7 @@ def get_cart(
     current_user: User = Depends(get_current_user)
 ):
     cart = db.query(Cart).\
+        options(CART_LOADER).\
         filter(
             Cart.id == cart_id,
             Cart.user_id == current_user.id
@@ -70,25 +107,17 @@ def create_cart(
     cart_dict = cart.model_dump()
 
     cart_items_data = cart_dict.pop("cart_items", [])
+    products = get_cart_products(db, [item_data['product_id'] for item_data in cart_items_data])
+
     cart_items = []
     total_amount = 0
     for item_data in cart_items_data:
-        product_id = item_data['product_id']
+        product = products[item_data['product_id']]
         quantity = item_data['quantity']
 
-        product = db.query(Product).\
-            filter(Product.id == product_id).\
-            first()
-
-        if not product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Product with id: {product_id} does not exist!"
-            )
-        
         subtotal = quantity * product.price * (1 - (product.discount_percentage / 100))
         cart_item = CartItem(
-            product_id=product_id, 
+            product_id=product.id, 
             quantity=quantity,
             subtotal=subtotal
         )
@@ -104,9 +133,11 @@ def create_cart(
 
     db.add(cart_db)
     db.commit()
-    db.refresh(cart_db)
 
-    return cart_db
+    # The committed items are expired, the payload has the same product ids without reloading them
+    record_cart(new_product_ids=[item_data['product_id'] for item_data in cart_items_data])
+
+    return get_loaded_cart(db, cart_db.id)
 
 
 @router.put(
@@ -133,32 +164,25 @@ def update_cart(
             detail=f"Cart with id: {cart_id} does not exist!"
         )
     
+    products = get_cart_products(db, [item.product_id for item in updated_cart.cart_items])
+
     cart_items = db.query(CartItem).\
         filter(CartItem.cart_id == cart_id).\
         all()
+    old_product_ids = [item.product_id for item in cart_items]
 
     for item in cart_items:
         db.delete(item)
 
     total_amount = 0
     for item in updated_cart.cart_items:
-        product_id = item.product_id
+        product = products[item.product_id]
         quantity = item.quantity
 
-        product = db.query(Product).\
-            filter(Product.id == product_id).\
-            first()
-
-        if not product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Product with id: {product_id} does not exist!"
-            )
-        
         subtotal = quantity * product.price * (1 - (product.discount_percentage / 100))
         cart_item = CartItem(
             cart_id=cart_id,
-            product_id=product_id, 
+            product_id=product.id, 
             quantity=quantity,
             subtotal=subtotal
         )
@@ -168,9 +192,13 @@ def update_cart(
     cart.total_amount = total_amount
 
     db.commit()
-    db.refresh(cart)
 
-    return cart
+    record_cart(
+        old_product_ids=old_product_ids,
+        new_product_ids=[item.product_id for item in updated_cart.cart_items]
+    )
+
+    return get_loaded_cart(db, cart_id)
 
 
 @router.delete(
@@ -195,7 +223,11 @@ def delete_cart(
             detail=f"Cart with id: {cart_id} does not exist!"
         )
 
+    product_ids = [product_id for product_id, in db.query(CartItem.product_id).filter(CartItem.cart_id == cart_id)]
+
     db.delete(cart)
     db.commit()
 
+    record_cart(old_product_ids=product_ids)
+
     return
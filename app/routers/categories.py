@@ -1,9 +1,10 @@
 from fastapi import APIRouter, status, Depends, Query, HTTPException
 from app.schemas.categories import CategoriesOut, CategoryOut, CategoryCreate, CategoryUpdate
 from app.database import get_db
+from app.search import lexical_match, lexical_rank
 from app.oauth2 import get_current_user, get_admin_user
 from app.models import User, Category
-from sqlalchemy import asc
+from sqlalchemy import asc, desc
 from sqlalchemy.orm import Session
 
 
@@ -25,9 +26,17 @@ def get_all_categories(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    categories = db.query(Category).\
+    search = search.strip()
+
+    query = db.query(Category)
+
+    if search:
+        query = query.\
+            filter(lexical_match(search, Category.name)).\
+            order_by(desc(lexical_rank(search, Category.name)))
+
+    categories = query.\
         order_by(asc(Category.id)).\
-        filter(Category.name.ilike(f"%{search}%")).\
         limit(limit).\
         offset((page - 1) * limit).\
         all()
@@ -2,7 +2,9 @@ from fastapi import APIRouter, Query, Depends, status, HTTPException
 from app.models import User, Product, Comment
 from app.database import get_db
 from app.oauth2 import get_current_user
-from app.huggingface import analyze_comment_sentiment
+from app.sentiment_worker import queue_comment, sentiment_worker
+from app.comment_aggregates import add_comment, remove_comment, remove_sentiment, apply_delta
+from app.comment_summaries import invalidate_comment_summary
 from app.schemas.comments import CommentCreate, CommentOut, CommentsOut, CommentUpdate
 from sqlalchemy import asc
 from sqlalchemy.orm import Session
@@ -104,24 +106,22 @@ def create_product_comment(
             detail=f"Product with id: {product_id} does not exist!"
         )
 
-    sentiment_analysis = analyze_comment_sentiment(new_comment.content)
-    sentiment_score = sentiment_analysis[0]["score"]
-    sentiment_label = sentiment_analysis[0]["label"]
-    
     comment = Comment(
         product_id=product_id,
         user_id=current_user.id,
         created_at=datetime.now(timezone.utc),
         content=new_comment.content.strip(),
-        rating=new_comment.rating,
-        sentiment_score=sentiment_score,
-        sentiment_label=sentiment_label
+        rating=new_comment.rating
     )
+    queue_comment(comment)
     
     db.add(comment)
+    add_comment(db, comment)
     db.commit()
     db.refresh(comment)
 
+    sentiment_worker.wake()
+
     return comment
 
 
@@ -147,11 +147,13 @@ def update_product_comment(
             detail=f"Product with id: {product_id} does not exist!"
         )
 
+    # Locked so the sentiment worker cannot classify it while its totals are adjusted
     comment = db.query(Comment).\
         filter(
             Comment.id == comment_id,
             Comment.product_id == product_id
         ).\
+        with_for_update().\
         first()
     
     if not comment:
@@ -166,18 +168,23 @@ def update_product_comment(
             detail="You are not authorized to edit this comment!"
         )
     
-    if comment.content != updated_comment.content:
+    content_changed = comment.content != updated_comment.content
+    if content_changed:
         comment.content = updated_comment.content
-        sentiment_analysis = analyze_comment_sentiment(comment.content)
-        comment.sentiment_label = sentiment_analysis["label"]
-        comment.sentiment_score = sentiment_analysis["score"]
+        remove_sentiment(db, comment)
+        queue_comment(comment)
+        invalidate_comment_summary(db, product_id, comment_id)
     
+    apply_delta(db, product_id, rating=updated_comment.rating - comment.rating)
     comment.rating = updated_comment.rating
     comment.created_at = datetime.now(timezone.utc)
 
     db.commit()
     db.refresh(comment)
 
+    if content_changed:
+        sentiment_worker.wake()
+
     return comment
 
 
@@ -201,11 +208,13 @@ def delete_product_comment(
             detail=f"Product with id: {product_id} does not exist!"
         )
 
+    # Locked so the sentiment worker cannot classify it while its totals are adjusted
     comment = db.query(Comment).\
         filter(
             Comment.id == comment_id,
             Comment.product_id == product_id
         ).\
+        with_for_update().\
         first()
     
     if not comment:
@@ -220,6 +229,8 @@ def delete_product_comment(
             detail="You are not authorized to delete this comment!"
         )
     
+    remove_comment(db, comment)
+    invalidate_comment_summary(db, product_id, comment_id)
     db.delete(comment)
     db.commit()
 
@@ -1,14 +1,29 @@
-from fastapi import APIRouter, status, Query, Depends, HTTPException, UploadFile, File
-from app.schemas.products import ProductsOut, ProductOut, ProductCreate, ProductUpdate, ProductsAIAnalysisOut, TextSearchRequest
+from fastapi import APIRouter, status, Query, Depends, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from app.schemas.products import ProductsOut, ProductOut, ProductCreate, ProductUpdate, ProductsAIAnalysisOut, TextSearchRequest, ProductsSearchOut, ProductsCoPurchaseOut
 from app.database import get_db
 from app.oauth2 import get_current_user, get_admin_user
-from app.models import User, Product, Category, Comment
-from sqlalchemy import asc, text
+from app.models import User, Product, Category
+from app.pagination import encode_cursor, decode_cursor, parse_cursor_value, keyset_filter
+from app.search import lexical_match, lexical_rank
+from app.loaders import PRODUCT_LOADER
+from app.sparse_fields import parse_product_fields, product_load_options, sparse_products_response
+from app.vector_search import SEARCH_FILTERS, get_products_by_ids, semantic_search, hybrid_search, encode_search_cursor, decode_search_cursor
+from app.vector_index import index_product, unindex_product
+from sqlalchemy import asc, desc
 from sqlalchemy.orm import Session
-from app.gemini import generate_product_description, refine_query, generate_comment_summary
-from app.huggingface import embed_product, embed_text
+from app.gemini import generate_product_description
+from app.llm import LLMUnavailable
+from app.huggingface import embed_product, product_embedding_hash
+from app.reembed import reembed_product
+from app.reduction import reduce_embedding
+from app.neighbours import NEIGHBOURS_K, get_similar_products, refresh_product_neighbours
+from app.copurchase import COPURCHASE_ENABLED, COPURCHASE_K, copurchase_matrix
+from app.comment_aggregates import get_comment_aggregate
+from app.comment_summaries import get_comment_summary
+from app.search_cache import refine_and_embed, embed_refined_query
 from app.speech_to_text import transcribe_audio
-from collections import Counter
+from typing import Literal, Optional
 
 
 router = APIRouter(
@@ -16,6 +31,13 @@ router = APIRouter(
     tags=["Products"]
 )
 
+PRODUCT_SORT_COLUMNS = {
+    "id": Product.id,
+    "price": Product.price,
+    "rating": Product.rating,
+    "created_at": Product.created_at
+}
+
 
 @router.get(
     path="/",
@@ -26,17 +48,82 @@ def get_all_products(
     search: str = "",
     page: int = Query(default=1, ge=1),
     limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    sort_by: Optional[Literal["relevance", "id", "price", "rating", "created_at"]] = None,
+    order: Optional[Literal["asc", "desc"]] = None,
+    fields: Optional[str] = Query(default=None, description="Comma separated sparse fieldset, e.g. id,title,price,thumbnail"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    products = db.query(Product).\
-        order_by(asc(Product.id)).\
-        filter(Product.title.ilike(f"%{search}%")).\
+    search = search.strip()
+    fields = parse_product_fields(fields)
+    # Searches are ranked by relevance unless the client asks for another order
+    sort_by = sort_by or ("relevance" if search else "id")
+    order = order or ("desc" if sort_by == "relevance" else "asc")
+
+    if sort_by == "relevance":
+        if not search:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Sorting by relevance requires a search term!"
+            )
+        sort_column = lexical_rank(search, Product.title, Product.search_vector)
+    else:
+        sort_column = PRODUCT_SORT_COLUMNS[sort_by]
+
+    descending = order == "desc"
+    direction = desc if descending else asc
+
+    query = db.query(Product, sort_column).\
+        options(*product_load_options(fields))
+
+    if search:
+        query = query.filter(lexical_match(search, Product.title, Product.search_vector))
+
+    if cursor:
+        position = decode_cursor(cursor)
+        if position.get("sort_by") != sort_by or position.get("order") != order or "id" not in position:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor does not match the requested sort_by and order!"
+            )
+
+        query = query.filter(keyset_filter(
+            sort_column=sort_column,
+            id_column=Product.id,
+            sort_value=parse_cursor_value(sort_column, position.get("value")),
+            last_id=parse_cursor_value(Product.id, position["id"]),
+            descending=descending
+        ))
+        offset = 0
+    else:
+        offset = (page - 1) * limit
+
+    # Product.id is appended as a tie breaker so the order is total and cursors are stable
+    order_by = [direction(sort_column)] if sort_column is Product.id else [direction(sort_column), direction(Product.id)]
+
+    rows = query.\
+        order_by(*order_by).\
         limit(limit).\
-        offset((page - 1) * limit).\
+        offset(offset).\
         all()
-    
-    return {"data": products}
+
+    products = [product for product, _ in rows]
+
+    next_cursor = None
+    if len(rows) == limit:
+        last_product, last_sort_value = rows[-1]
+        next_cursor = encode_cursor({
+            "sort_by": sort_by,
+            "order": order,
+            "value": last_sort_value,
+            "id": last_product.id
+        })
+
+    if fields:
+        return sparse_products_response(products, fields, next_cursor=next_cursor)
+
+    return {"data": products, "next_cursor": next_cursor}
         
 
 @router.get(
@@ -50,6 +137,7 @@ def get_product(
     current_user: User = Depends(get_current_user)
 ):
     product = db.query(Product).\
+        options(PRODUCT_LOADER).\
         filter(Product.id == product_id).\
         first()
 
@@ -68,6 +156,7 @@ def get_product(
 )
 def create_product(
     new_product: ProductCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_admin_user)
 ):
@@ -84,23 +173,32 @@ def create_product(
     new_product_dict = new_product.model_dump()
     product = Product(**new_product_dict)
 
-    product.category = db.query(Category).\
-        filter(Category.id == product.category_id).\
-        first()
+    product.category = category_exists
 
     if not product.description:
-        product.description = generate_product_description(product)
+        try:
+            product.description = generate_product_description(product)
+        except LLMUnavailable:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Description generation is unavailable, provide a description!"
+            )
 
     product.embedding = embed_product(
         title=product.title,
         description=product.description,
         brand=product.brand
     )
+    product.embedding_hash = product_embedding_hash(product.title, product.description, product.brand)
+    product.embedding_reduced, product.embedding_reduced_version = reduce_embedding(db, product.embedding)
 
     db.add(product)
     db.commit()
     db.refresh(product)
 
+    index_product(product.id, product.embedding)
+    background_tasks.add_task(refresh_product_neighbours, product.id)
+
     return product
 
 
@@ -112,6 +210,7 @@ def create_product(
 def update_product(
     product_id: int,
     updated_product: ProductUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_admin_user)
 ):
@@ -141,6 +240,10 @@ def update_product(
     db.commit()
     db.refresh(product)
 
+    # Price or stock only updates keep the embedding, text changes are re-embedded after the response
+    if product_embedding_hash(product.title, product.description, product.brand) != product.embedding_hash:
+        background_tasks.add_task(reembed_product, product.id)
+
     return product
 
 
@@ -166,75 +269,151 @@ def delete_product(
     db.delete(product)
     db.commit()
 
+    unindex_product(product_id)
+
     return
 
 
+@router.get(
+    path="/{product_id}/similar",
+    status_code=status.HTTP_200_OK,
+    response_model=ProductsSearchOut
+)
+def get_similar_products_of_product(
+    product_id: int,
+    limit: int = Query(default=10, ge=1, le=NEIGHBOURS_K),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    fields = parse_product_fields(fields)
+
+    result_data, scores = get_similar_products(db, product_id, limit)
+
+    if not result_data and not db.query(Product.id).filter(Product.id == product_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Product with id: {product_id} does not exist!"
+        )
+
+    if fields:
+        return sparse_products_response(result_data, fields, scores=scores)
+
+    return {"data": result_data, "scores": scores}
+
+
+@router.get(
+    path="/{product_id}/frequently_bought_together",
+    status_code=status.HTTP_200_OK,
+    response_model=ProductsCoPurchaseOut
+)
+def get_frequently_bought_together(
+    product_id: int,
+    limit: int = Query(default=10, ge=1, le=COPURCHASE_K),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if not COPURCHASE_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Co-purchase recommendations are disabled!"
+        )
+
+    fields = parse_product_fields(fields)
+
+    # Over-fetch, unpublished products are dropped by the lookup
+    top = copurchase_matrix.top(product_id)
+    result_data = get_products_by_ids(db, [other_id for other_id, _, _ in top], {"is_published": True})[:limit]
+
+    if not result_data and not db.query(Product.id).filter(Product.id == product_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Product with id: {product_id} does not exist!"
+        )
+
+    top = {other_id: (score, count) for other_id, score, count in top}
+    scores = [
+        {"product_id": product["id"], "score": top[product["id"]][0], "count": top[product["id"]][1]}
+        for product in result_data
+    ]
+
+    if fields:
+        return sparse_products_response(result_data, fields, scores=scores)
+
+    return {"data": result_data, "scores": scores}
+
+
 @router.post(
     path="/text_search",
     status_code=status.HTTP_200_OK,
-    response_model=ProductsOut
+    response_model=ProductsSearchOut
 )
 def text_search_products(
     body: TextSearchRequest,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    refined_query = refine_query(body.search)
+    fields = parse_product_fields(body.fields)
+    filters = body.model_dump(include=SEARCH_FILTERS)
+
+    after, offset = None, 0
+    if body.cursor:
+        if body.mode != "semantic":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursors are only supported in semantic mode!"
+            )
+        after, offset, refined_query = decode_search_cursor(body.search, filters, body.cursor)
+        # Later pages reuse the first page's refinement, usually from the query cache
+        query_embedding = embed_refined_query(body.search, refined_query)
+    else:
+        refined_query, query_embedding = refine_and_embed(body.search)
 
     print(f"REFINED QUERY: {refined_query}")
 
-    query_embedding = embed_text(refined_query)
-
-    embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
-
-    sql = text(f"""
-        SELECT 
-            products.*,
-            categories.id AS category_id,
-            categories.name AS category_name,
-            embedding <=> :embedding AS distance
-        FROM products
-        JOIN categories ON products.category_id = categories.id
-        ORDER BY distance
-        LIMIT :limit
-    """)
-    result = db.execute(sql, {"embedding": embedding_str, "limit": body.limit}).mappings().all()
-
-    result_data = []
-
-    for row in result:
-        row = dict(row)
-        product = {
-            "id": row["id"],
-            "title": row["title"],
-            "description": row["description"],
-            "price": row["price"],
-            "discount_percentage": row["discount_percentage"],
-            "rating": row["rating"],
-            "stock": row["stock"],
-            "brand": row["brand"],
-            "thumbnail": row["thumbnail"],
-            "images": row["images"],
-            "is_published": row["is_published"],
-            "created_at": row["created_at"],
-            "category": {
-                "id": row["category_id"],
-                "name": row["category_name"]
-            }
-        }
-        result_data.append(product)
-
-    return {"data": result_data}
+    if body.mode == "hybrid":
+        result_data, scores = hybrid_search(
+            db=db,
+            search=body.search,
+            query_embedding=query_embedding,
+            limit=body.limit,
+            candidates=body.candidates,
+            lexical_weight=body.lexical_weight,
+            semantic_weight=body.semantic_weight,
+            rrf_k=body.rrf_k,
+            ef_search=body.ef_search,
+            filters=filters
+        )
+    else:
+        result_data, scores = semantic_search(
+            db=db,
+            query_embedding=query_embedding,
+            limit=body.limit,
+            ef_search=body.ef_search,
+            filters=filters,
+            after=after,
+            offset=offset
+        )
+
+    next_cursor = None
+    if body.mode == "semantic" and len(result_data) == body.limit:
+        next_cursor = encode_search_cursor(body.search, filters, refined_query, scores[-1], offset + len(result_data))
+
+    if fields:
+        return sparse_products_response(result_data, fields, scores=scores, next_cursor=next_cursor)
+
+    return {"data": result_data, "scores": scores, "next_cursor": next_cursor}
     
 
 @router.post(
     path="/voice_search",
     status_code=status.HTTP_200_OK,
-    response_model=ProductsOut
+    response_model=ProductsSearchOut
 )
 async def voice_search_products(
     file: UploadFile = File(...),
-    limit: int = 10,
+    limit: int = Query(default=10, ge=1, le=100),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -245,7 +424,9 @@ async def voice_search_products(
         limit=limit
     )
 
-    result = text_search_products(
+    # Refinement, embedding and the database query block, keep them off the event loop
+    result = await run_in_threadpool(
+        text_search_products,
         body=body,
         db=db,
         current_user=current_user
@@ -265,6 +446,7 @@ def get_product_ai_analysis(
     current_user: User = Depends(get_current_user)
 ):
     product = db.query(Product).\
+        options(PRODUCT_LOADER).\
         filter(Product.id == product_id).\
         first()
 
@@ -274,25 +456,32 @@ def get_product_ai_analysis(
             detail=f"Product with id: {product_id} does not exist!"
         )
 
-    comments = db.query(Comment).\
-        filter(Comment.product_id == product_id).\
-        all()
+    aggregate = get_comment_aggregate(db, product_id)
 
-    len_comments = len(comments)
-    if len_comments == 0:
+    if not aggregate or aggregate.comment_count == 0:
         raise HTTPException(
             status_code=status.HTTP_204_NO_CONTENT,
             detail=F"Product with id: {product_id} does not have any comments!"
         )
 
-    sentiment_score_avg = sum([+1 if comment.sentiment_label == "positive" else -1 if comment.sentiment_label == "negative" else 0 for comment in comments]) / len_comments
-    sentiment_label_counts = Counter([comment.sentiment_label for comment in comments])
-    comments_summary = generate_comment_summary([comment.content for comment in comments])
+    # Comments still waiting for the sentiment worker are left out of the sentiment figures
+    label_counts = aggregate.label_counts
+    sentiment_score_avg = (label_counts.get("positive", 0) - label_counts.get("negative", 0)) / aggregate.classified_count if aggregate.classified_count else 0.0
+    sentiment_label_counts = {label: count for label, count in label_counts.items() if count}
+    try:
+        comments_summary = get_comment_summary(db, product_id)
+    except LLMUnavailable:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Comment summary is unavailable, try again later!"
+        )
 
     result = {
         "product": product, 
         "sentiment_score_avg": sentiment_score_avg, 
         "sentiment_label_counts": sentiment_label_counts, 
+        "comment_count": aggregate.comment_count,
+        "rating_avg": aggregate.rating_sum / aggregate.comment_count,
         "comments_summary": comments_summary
     }
 
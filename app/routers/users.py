@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Query, status, Depends, HTTPException
 from app.schemas.users import UsersOut, UserOut, UserCreate, UserUpdate
 from app.database import get_db
+from app.search import lexical_match, lexical_rank
 from app.oauth2 import get_current_user, get_admin_user
 from app.models import User
+from app.loaders import USER_LOADER
 from app.utils import hash
-from sqlalchemy import asc
+from sqlalchemy import asc, desc
 from sqlalchemy.orm import Session
 
 
@@ -27,12 +29,19 @@ def get_all_users(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_admin_user)
 ):
-    users = db.query(User).\
+    search = search.strip()
+
+    query = db.query(User).\
+        options(USER_LOADER).\
+        filter(User.role == role)
+
+    if search:
+        query = query.\
+            filter(lexical_match(search, User.username)).\
+            order_by(desc(lexical_rank(search, User.username)))
+
+    users = query.\
         order_by(asc(User.id)).\
-        filter(
-            User.username.ilike(f"%{search}%"),
-            User.role == role
-        ).\
         limit(limit).\
         offset((page - 1) * limit).\
         all()
@@ -51,6 +60,7 @@ def get_user(
     current_user: User = Depends(get_current_user)
 ):
     user = db.query(User).\
+        options(USER_LOADER).\
         filter(User.id == user_id).\
         first()
 
@@ -114,6 +124,7 @@ def update_user(
     current_user: User = Depends(get_current_user)
 ):
     user = db.query(User).\
+        options(USER_LOADER).\
         filter(
             User.id == current_user.id,
             User.id == user_id
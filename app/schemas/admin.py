@@ -0,0 +1,92 @@
+from pydantic import BaseModel
+from typing import Dict, Literal, Optional
+
+
+class QueryCacheStats(BaseModel):
+    size: int
+    maxsize: int
+    ttl_seconds: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+
+class LLMCacheStats(BaseModel):
+    enabled: bool
+    size: int
+    maxsize: int
+    ttl_seconds: int
+    hits: int
+    misses: int
+    hit_rate: float
+    stores: int
+    evicted: int
+    errors: int
+
+
+class CacheStatsOut(BaseModel):
+    query_cache: QueryCacheStats
+    llm_cache: LLMCacheStats
+
+
+class BatcherStats(BaseModel):
+    batches: int
+    items: int
+    avg_batch_size: float
+    queued: int
+
+
+class InferenceStatsOut(BaseModel):
+    embedding: BatcherStats
+    sentiment: BatcherStats
+
+
+class WarmupOut(BaseModel):
+    seconds: Dict[str, float]
+
+
+class JobStatusOut(BaseModel):
+    state: Literal["idle", "running", "done", "failed"]
+    total: int
+    processed: int
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+
+class ReembedStatusOut(JobStatusOut):
+    force: bool
+    batch_size: int
+    reembedded: int
+    last_product_id: Optional[int] = None
+
+
+class NeighboursStatusOut(JobStatusOut):
+    batch_size: int
+    k: int
+
+
+class SentimentWorkerStats(BaseModel):
+    batches: int
+    classified: int
+    failures: int
+    last_batch_at: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+class SentimentQueueOut(BaseModel):
+    pending: int
+    failed: int
+    lag_seconds: float
+    worker: SentimentWorkerStats
+
+
+class LLMStatsOut(BaseModel):
+    backend: str
+    breaker_state: Literal["closed", "open", "half_open"]
+    breaker_opened: int
+    calls: int
+    failures: int
+    timeouts: int
+    rejected: int
+    in_flight: int
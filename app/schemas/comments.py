@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List
+from typing import List, Literal, Optional
 
 
 class CommentBase(BaseModel):
@@ -9,8 +9,9 @@ class CommentBase(BaseModel):
     content: str
     rating: float
     created_at: datetime
-    sentiment_score: float
-    sentiment_label: str
+    sentiment_score: Optional[float] = None
+    sentiment_label: Optional[str] = None
+    sentiment_status: Literal["pending", "done", "failed"]
 
     class Config:
         from_attributes = True
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 from app.schemas.categories import CategoryBase
 
 
@@ -70,6 +70,7 @@ class ProductOut(ProductBase):
 
 class ProductsOut(BaseModel):
     data: List[ProductBase]
+    next_cursor: Optional[str] = None
 
     class Config(BaseConfig):
         pass
@@ -79,6 +80,8 @@ class ProductsAIAnalysisOut(BaseModel):
     product: ProductBase
     sentiment_score_avg: float
     sentiment_label_counts: dict
+    comment_count: int
+    rating_avg: float
     comments_summary: str
 
     class Config(BaseConfig):
@@ -87,4 +90,57 @@ class ProductsAIAnalysisOut(BaseModel):
 
 class TextSearchRequest(BaseModel):
     search: str
-    limit: int = 10
\ No newline at end of file
+    limit: int = Field(default=10, ge=1, le=100)
+    fields: Optional[str] = None
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    mode: Literal["semantic", "hybrid"] = "semantic"
+    # Semantic mode: next_cursor of the previous page, sent with the same search and filters
+    cursor: Optional[str] = None
+    # Hybrid mode: candidates per retriever and reciprocal rank fusion weights
+    candidates: int = Field(default=100, ge=1, le=1000)
+    lexical_weight: float = Field(default=1.0, ge=0)
+    semantic_weight: float = Field(default=1.0, ge=0)
+    rrf_k: int = Field(default=60, ge=1)
+    # Filters, applied inside the vector query; None disables a filter
+    category_id: Optional[int] = None
+    brand: Optional[str] = None
+    min_price: Optional[float] = Field(default=None, ge=0)
+    max_price: Optional[float] = Field(default=None, ge=0)
+    in_stock: Optional[bool] = None
+    is_published: Optional[bool] = True
+
+    @model_validator(mode='after')
+    def validate_price_range(self):
+        if self.min_price is not None and self.max_price is not None and self.min_price > self.max_price:
+            raise ValueError("min_price must not be greater than max_price")
+        return self
+
+
+class SearchScore(BaseModel):
+    product_id: int
+    score: float
+    semantic_rank: Optional[int] = None
+    distance: Optional[float] = None
+    lexical_rank: Optional[int] = None
+    lexical_score: Optional[float] = None
+
+
+class ProductsSearchOut(ProductsOut):
+    scores: List[SearchScore] = []
+
+    class Config(BaseConfig):
+        pass
+
+
+class CoPurchaseScore(BaseModel):
+    product_id: int
+    score: float
+    # Carts containing both products
+    count: int
+
+
+class ProductsCoPurchaseOut(ProductsOut):
+    scores: List[CoPurchaseScore] = []
+
+    class Config(BaseConfig):
+        pass
@@ -0,0 +1,50 @@
+from sqlalchemy import Float, func, or_
+
+
+# Text search configuration used for every tsvector / tsquery. "simple" does no
+# stemming, which keeps Turkish and English product data on the same footing.
+SEARCH_CONFIG = "simple"
+
+
+def escape_like(search: str) -> str:
+    """
+    Escape LIKE wildcards so user input is always matched literally.
+    """
+    return search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def lexical_match(search: str, trigram_column, vector_column=None):
+    """
+    Build the WHERE clause for a lexical search.
+
+    The substring match is served by a pg_trgm GIN index on `trigram_column`,
+    the optional full-text match by a GIN index on the tsvector `vector_column`.
+    Postgres combines both with a BitmapOr, so neither side scans the table.
+
+    Args:
+        search (str): Raw user input.
+        trigram_column: Column with a `gin_trgm_ops` index.
+        vector_column: Optional tsvector column with a GIN index.
+    """
+    condition = trigram_column.ilike(f"%{escape_like(search)}%", escape="\\")
+
+    if vector_column is not None:
+        condition = or_(
+            condition,
+            vector_column.op("@@")(func.websearch_to_tsquery(SEARCH_CONFIG, search))
+        )
+    return condition
+
+
+def lexical_rank(search: str, trigram_column, vector_column=None):
+    """
+    Relevance of a row for `search`, higher is better.
+
+    Trigram similarity rewards close title matches and typos, `ts_rank_cd`
+    rewards documents where the query terms appear close together.
+    """
+    rank = func.similarity(trigram_column, search)
+
+    if vector_column is not None:
+        rank = rank + func.ts_rank_cd(vector_column, func.websearch_to_tsquery(SEARCH_CONFIG, search))
+    return rank.cast(Float)
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import threading
+from dotenv import load_dotenv
+from cachetools import TLRUCache
+from typing import List, NamedTuple, Optional, Tuple
+from app.gemini import refine_query
+from app.llm import LLMUnavailable
+from app.huggingface import embed_text
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
+
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '10000'))
+QUERY_CACHE_TTL_SECONDS = int(os.getenv('QUERY_CACHE_TTL_SECONDS', '86400'))
+# Optional JSON file the cache is loaded from at startup and saved to at shutdown
+QUERY_CACHE_PATH = os.getenv('QUERY_CACHE_PATH')
+
+
+class CachedQuery(NamedTuple):
+    refined_query: str
+    embedding: List[float]
+    expires_at: float
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+class QueryCache:
+    """
+    Bounded LRU cache with per-entry expiry for refined search queries and their embeddings.
+
+    Keys are normalized raw user queries, so a hit skips both the Gemini
+    refinement and the embedding forward pass. Thread safe, since sync
+    endpoints run in a thread pool.
+    """
+
+    def __init__(self, maxsize: int, ttl: int, path: Optional[str] = None):
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._cache = TLRUCache(
+            maxsize=maxsize,
+            ttu=lambda key, value, now: value.expires_at,
+            timer=time.time
+        )
+
+    def get(self, query: str) -> Optional[CachedQuery]:
+        with self._lock:
+            entry = self._cache.get(normalize_query(query))
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, query: str, refined_query: str, embedding: List[float]):
+        entry = CachedQuery(refined_query, embedding, time.time() + self.ttl)
+        with self._lock:
+            self._cache[normalize_query(query)] = entry
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def load(self):
+        """
+        Restore unexpired entries from `path`, if persistence is configured.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        # A corrupt or truncated file only costs the warm cache, not the startup
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+
+            now = time.time()
+            loaded = [
+                (key, CachedQuery(refined_query, embedding, expires_at))
+                for key, (refined_query, embedding, expires_at) in entries.items()
+                if expires_at > now
+            ]
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"Query cache {self.path} could not be loaded, starting empty: {type(e).__name__}: {e}")
+            return
+
+        with self._lock:
+            for key, entry in loaded:
+                self._cache[key] = entry
+
+    def save(self):
+        """
+        Write the cache to `path` atomically, if persistence is configured.
+        """
+        if not self.path:
+            return
+
+        with self._lock:
+            self._cache.expire()
+            entries = {key: list(entry) for key, entry in self._cache.items()}
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+
+query_cache = QueryCache(
+    maxsize=QUERY_CACHE_SIZE,
+    ttl=QUERY_CACHE_TTL_SECONDS,
+    path=QUERY_CACHE_PATH
+)
+
+
+def refine_and_embed(search: str) -> Tuple[str, List[float]]:
+    """
+    Refine a raw search query with Gemini and embed it, going through the query cache.
+
+    When Gemini is unavailable the raw query is embedded instead, and not
+    cached, so the refinement is tried again once Gemini is back.
+
+    Args:
+        search (str): Raw user query.
+
+    Returns:
+        Tuple: Refined query and its embedding.
+    """
+    cached = query_cache.get(search)
+    if cached is not None:
+        return cached.refined_query, cached.embedding
+
+    try:
+        refined_query = refine_query(search)
+    except LLMUnavailable:
+        return search, [float(value) for value in embed_text(search)]
+
+    embedding = [float(value) for value in embed_text(refined_query)]
+
+    query_cache.put(search, refined_query, embedding)
+
+    return refined_query, embedding
+
+
+def embed_refined_query(search: str, refined_query: str) -> List[float]:
+    """
+    Embedding of a query refined earlier, e.g. the one carried by a search cursor.
+
+    Comes from the query cache while its entry still holds the same
+    refinement, otherwise `refined_query` is embedded again; Gemini is
+    never asked, so every page of a search uses the same vector.
+    """
+    cached = query_cache.get(search)
+    if cached is not None and cached.refined_query == refined_query:
+        return cached.embedding
+
+    return [float(value) for value in embed_text(refined_query)]
@@ -0,0 +1,141 @@
+"""
+Measure the approximate semantic search against exact nearest neighbours.
+
+    python -m app.search_check
+    python -m app.search_check --queries 200 --k 10 --ef-search 20 40 100 200
+    python -m app.search_check --vector-index
+    python -m app.search_check --category-id 3 --max-price 50 --in-stock
+
+Uses random product embeddings as queries and reports recall@k of the
+configured EMBEDDING_STORAGE (index walk plus re-ranking) against an exact
+scan, the median and p95 latency of both, and the size of the table and of
+its embedding indexes. Several --ef-search values give the recall vs latency
+curve of the index. `--vector-index` also loads the in-process vector index
+(VECTOR_INDEX_DTYPE) and measures it on the same queries, unfiltered only.
+
+The search filters (--category-id, --brand, --min-price, --max-price,
+--in-stock, --published) are applied to both the index walk and the exact
+scan, as semantic search applies them. The share of products passing them
+and the rows returned per query show whether selective filters still fill
+a page.
+"""
+import argparse
+import time
+import numpy as np
+from sqlalchemy import func, text
+from app.database import SessionLocal
+from app.models import EMBEDDING_STORAGE, Product
+from app.vector_index import VECTOR_INDEX_DTYPE, load_vector_index, vector_index
+from app.vector_search import HNSW_EF_SEARCH, HNSW_MAX_EF_SEARCH, SEARCH_FILTERS, embedding_params, nearest_sql, product_filters, rerank_limit, set_search_params
+
+
+def timed_ids(db, sql, params: dict) -> tuple:
+    started = time.perf_counter()
+    ids = [row[0] for row in db.execute(sql, params)]
+    return ids, time.perf_counter() - started
+
+
+def timed_index_ids(embedding, k: int) -> tuple:
+    started = time.perf_counter()
+    ids, _ = vector_index.search(embedding, k)
+    return ids.tolist(), time.perf_counter() - started
+
+
+def check(queries: int, k: int, ef_searches: list = None, in_process: bool = False, filters: dict = None):
+    filters = {key: value for key, value in (filters or {}).items() if value is not None}
+    if in_process and filters:
+        print("The in-process index is only measured without filters")
+        in_process = False
+
+    if in_process:
+        started = time.perf_counter()
+        load_vector_index()
+        load_seconds = time.perf_counter() - started
+
+    db = SessionLocal()
+    try:
+        embeddings = [row.embedding for row in db.query(Product.embedding).order_by(func.random()).limit(queries)]
+        condition, filter_params = product_filters(**filters)
+        sql = text(nearest_sql("products.id", condition, ":limit"))
+        exact_sql = text(nearest_sql("products.id", condition, ":limit", storage="vector"))
+        ef_searches = ef_searches or [None]
+
+        recalls = {ef_search: [] for ef_search in ef_searches}
+        approximate_seconds = {ef_search: [] for ef_search in ef_searches}
+        returned = {ef_search: [] for ef_search in ef_searches}
+        exact_seconds, index_recalls, index_seconds = [], [], []
+        for embedding in embeddings:
+            params = {**embedding_params(db, embedding), **filter_params, "limit": k, "rerank_limit": rerank_limit(k)}
+
+            # Full precision distances without index scans are the exact answer
+            db.execute(text("SET LOCAL enable_indexscan = off"))
+            exact, seconds = timed_ids(db, exact_sql, params)
+            exact_seconds.append(seconds)
+            db.rollback()
+
+            for ef_search in ef_searches:
+                set_search_params(db, limit=rerank_limit(k), ef_search=ef_search, filtered=bool(filters))
+                approximate, seconds = timed_ids(db, sql, params)
+                approximate_seconds[ef_search].append(seconds)
+                returned[ef_search].append(len(approximate))
+                db.rollback()
+
+                recalls[ef_search].append(len(set(approximate) & set(exact)) / max(len(exact), 1))
+
+            if in_process:
+                approximate, seconds = timed_index_ids(embedding, k)
+                index_seconds.append(seconds)
+                index_recalls.append(len(set(approximate) & set(exact)) / max(len(exact), 1))
+
+        print(f"EMBEDDING_STORAGE={EMBEDDING_STORAGE}, {len(embeddings)} queries, k={k}")
+        if filters:
+            passing = db.execute(text(f"SELECT avg(({condition})::int) FROM products"), filter_params).scalar()
+            print(f"Filters {filters}: {float(passing or 0):.4%} of products pass")
+        print(f"Latency exact: median {np.median(exact_seconds) * 1000:.2f} ms, p95 {np.percentile(exact_seconds, 95) * 1000:.2f} ms")
+        for ef_search in ef_searches:
+            # The effective value, set_search_params raises it to the candidates needed and caps it
+            effective = min(max(ef_search or HNSW_EF_SEARCH, rerank_limit(k)), HNSW_MAX_EF_SEARCH)
+            seconds = approximate_seconds[ef_search]
+            print(
+                f"ef_search={effective}: recall@{k} mean {np.mean(recalls[ef_search]):.4f}, min {np.min(recalls[ef_search]):.4f}, "
+                f"rows returned mean {np.mean(returned[ef_search]):.1f}, "
+                f"latency median {np.median(seconds) * 1000:.2f} ms, p95 {np.percentile(seconds, 95) * 1000:.2f} ms"
+            )
+
+        if in_process:
+            size = len(vector_index) * vector_index.dim * vector_index.dtype.itemsize
+            print(f"In-process index ({VECTOR_INDEX_DTYPE}, {len(vector_index)} rows, {size / 2 ** 20:.1f} MiB, loaded in {load_seconds:.2f} s)")
+            print(
+                f"In-process: recall@{k} mean {np.mean(index_recalls):.4f}, min {np.min(index_recalls):.4f}, "
+                f"latency median {np.median(index_seconds) * 1000:.2f} ms, p95 {np.percentile(index_seconds, 95) * 1000:.2f} ms"
+            )
+
+        sizes = db.execute(text("""
+            SELECT indexname, pg_relation_size(quote_ident(indexname)::regclass)
+            FROM pg_indexes
+            WHERE tablename = 'products' AND indexname LIKE 'ix_products_embedding%'
+            UNION ALL
+            SELECT 'products (table)', pg_total_relation_size('products')
+        """)).all()
+        for name, size in sizes:
+            print(f"Size {name}: {size / 2 ** 20:.1f} MiB")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure recall, latency and index size of semantic search.")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=None, help="One or more values to compare, defaults to HNSW_EF_SEARCH")
+    parser.add_argument("--vector-index", action="store_true", help="Also measure the in-process vector index")
+    parser.add_argument("--category-id", type=int, default=None)
+    parser.add_argument("--brand", default=None)
+    parser.add_argument("--min-price", type=float, default=None)
+    parser.add_argument("--max-price", type=float, default=None)
+    parser.add_argument("--in-stock", action="store_true", default=None)
+    parser.add_argument("--published", action="store_true", default=None, dest="is_published")
+    args = parser.parse_args()
+
+    filters = {key: getattr(args, key) for key in SEARCH_FILTERS}
+    check(args.queries, args.k, args.ef_search, args.vector_index, filters)
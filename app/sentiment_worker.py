@@ -0,0 +1,209 @@
+"""
+Background sentiment classification of comments.
+
+    python -m app.sentiment_worker
+    python -m app.sentiment_worker --once
+
+Comments are saved with sentiment_status "pending" and classified here,
+a batch at a time. Every API worker runs one in a thread (unless
+SENTIMENT_WORKER_ENABLED=false) and more can run as separate processes:
+batches are claimed with FOR UPDATE SKIP LOCKED, so workers never classify
+the same comment twice. `--once` drains the queue and exits.
+"""
+import argparse
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Comment
+from app.huggingface import analyze_comments_sentiment
+from app.comment_aggregates import add_sentiments
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
+
+SENTIMENT_WORKER_ENABLED = os.getenv('SENTIMENT_WORKER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SENTIMENT_BATCH_SIZE = int(os.getenv('SENTIMENT_BATCH_SIZE', '32'))
+# How often an idle worker looks for comments created through other workers
+SENTIMENT_POLL_SECONDS = float(os.getenv('SENTIMENT_POLL_SECONDS', '2'))
+# Failed classifications of a comment after which it is marked failed instead of retried
+SENTIMENT_MAX_ATTEMPTS = int(os.getenv('SENTIMENT_MAX_ATTEMPTS', '3'))
+
+CLAIM_PENDING = text("""
+    SELECT id, product_id, content
+    FROM comments
+    WHERE sentiment_status = 'pending'
+    ORDER BY id
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+""")
+
+RECORD_FAILURE = text("""
+    UPDATE comments
+    SET
+        sentiment_attempts = sentiment_attempts + 1,
+        sentiment_status = CASE WHEN sentiment_attempts + 1 >= :max_attempts THEN 'failed' ELSE 'pending' END
+    WHERE id = ANY(:ids)
+""")
+
+
+class SentimentWorker:
+    """
+    Drains the pending comments through the sentiment model.
+
+    A claimed batch stays locked until its results are committed; a comment
+    edited meanwhile waits for the lock and goes back to pending. Comments
+    the model fails on are retried on the next pass until
+    SENTIMENT_MAX_ATTEMPTS, the rest of their batch is saved.
+    Stats are per process.
+    """
+
+    def __init__(self, batch_size: int = SENTIMENT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.batches = 0
+        self.classified = 0
+        self.failures = 0
+        self.last_batch_at = None
+        self.last_error = None
+        self._wakeup = threading.Event()
+
+    def wake(self):
+        """
+        Start the next pass now instead of at the next poll, called after comments are queued.
+        """
+        self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "classified": self.classified,
+            "failures": self.failures,
+            "last_batch_at": self.last_batch_at,
+            "last_error": self.last_error
+        }
+
+    def drain_batch(self, db: Session) -> int:
+        """
+        Claim and classify one batch.
+
+        Returns:
+            int: Number of comments claimed, 0 when the queue is empty.
+        """
+        rows = db.execute(CLAIM_PENDING, {"limit": self.batch_size}).all()
+        if not rows:
+            db.rollback()
+            return 0
+
+        try:
+            results = analyze_comments_sentiment([row.content for row in rows])
+        except Exception as e:
+            # E.g. the model server is unreachable, nothing was classified
+            results = [e] * len(rows)
+
+        classified = [(row, result) for row, result in zip(rows, results) if not isinstance(result, Exception)]
+        failed = [(row, result) for row, result in zip(rows, results) if isinstance(result, Exception)]
+
+        if classified:
+            db.bulk_update_mappings(Comment, [
+                {"id": row.id, "sentiment_score": result["score"], "sentiment_label": result["label"], "sentiment_status": "done"}
+                for row, result in classified
+            ])
+            add_sentiments(db, [(row.product_id, result["label"], result["score"]) for row, result in classified])
+        if failed:
+            # Only the comments that failed themselves, still holding the row locks,
+            # so no other worker can have classified them meanwhile
+            db.execute(RECORD_FAILURE, {"ids": [row.id for row, _ in failed], "max_attempts": SENTIMENT_MAX_ATTEMPTS})
+        db.commit()
+
+        if classified:
+            self.batches += 1
+            self.classified += len(classified)
+            self.last_batch_at = time.time()
+        if failed:
+            self.failures += 1
+            error = failed[0][1]
+            self.last_error = f"{type(error).__name__}: {error}"
+        return len(rows)
+
+    def drain(self) -> int:
+        """
+        Classify batches until no pending comment is left unclaimed, or a batch fails.
+
+        Returns:
+            int: Number of comments claimed.
+        """
+        db = SessionLocal()
+        try:
+            total = 0
+            while True:
+                failures = self.failures
+                claimed = self.drain_batch(db)
+                total += claimed
+                # A failed batch is retried on the next pass, not right away
+                if claimed < self.batch_size or self.failures != failures:
+                    return total
+        finally:
+            db.close()
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            self._wakeup.clear()
+            try:
+                self.drain()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+
+            self._wakeup.wait(SENTIMENT_POLL_SECONDS)
+
+
+sentiment_worker = SentimentWorker()
+
+
+def queue_stats(db: Session) -> dict:
+    """
+    Depth and lag of the sentiment queue, across all workers.
+    """
+    row = db.execute(text("""
+        SELECT
+            count(*) FILTER (WHERE sentiment_status = 'pending') AS pending,
+            count(*) FILTER (WHERE sentiment_status = 'failed') AS failed,
+            EXTRACT(EPOCH FROM NOW() - min(created_at) FILTER (WHERE sentiment_status = 'pending')) AS lag_seconds
+        FROM comments
+        WHERE sentiment_status IN ('pending', 'failed')
+    """)).mappings().one()
+
+    return {
+        "pending": row["pending"],
+        "failed": row["failed"],
+        "lag_seconds": float(row["lag_seconds"] or 0),
+        "worker": sentiment_worker.stats()
+    }
+
+
+def queue_comment(comment: Comment):
+    """
+    Reset a new or edited comment's sentiment, the worker fills it in after the commit.
+    """
+    comment.sentiment_score = None
+    comment.sentiment_label = None
+    comment.sentiment_status = "pending"
+    comment.sentiment_attempts = 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify the sentiment of pending comments.")
+    parser.add_argument("--batch-size", type=int, default=SENTIMENT_BATCH_SIZE)
+    parser.add_argument("--once", action="store_true", help="Drain the queue and exit instead of polling")
+    args = parser.parse_args()
+
+    worker = SentimentWorker(batch_size=args.batch_size)
+    if args.once:
+        worker.drain()
+        print(f"Classified {worker.classified} comments")
+        if worker.last_error:
+            print(worker.last_error)
+    else:
+        worker.run(threading.Event())
@@ -0,0 +1,76 @@
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import load_only
+from typing import List, Optional
+from app.loaders import PRODUCT_LOADER
+from app.models import Product
+from app.schemas.products import ProductBase
+
+
+PRODUCT_FIELDS = tuple(ProductBase.model_fields)
+
+
+def parse_product_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a comma separated `fields=` sparse fieldset, e.g. "id,title,price,thumbnail".
+
+    Args:
+        fields (str): Raw parameter value, None or empty for the full representation.
+
+    Returns:
+        List: Requested fields with `id` always first, or None when every field is wanted.
+
+    Raises:
+        HTTPException: 400 if a field is not part of ProductBase.
+    """
+    if not fields:
+        return None
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in PRODUCT_FIELDS]
+
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown product fields: {', '.join(unknown)}! Allowed fields: {', '.join(PRODUCT_FIELDS)}"
+        )
+
+    return ["id"] + [field for field in dict.fromkeys(requested) if field != "id"]
+
+
+def product_load_options(fields: Optional[List[str]]) -> list:
+    """
+    ORM loader options that select only the columns a sparse fieldset needs.
+    """
+    if fields is None:
+        return [PRODUCT_LOADER]
+
+    columns = [getattr(Product, field) for field in fields if field != "category"]
+    options = [load_only(*columns)]
+
+    if "category" in fields:
+        options.append(PRODUCT_LOADER)
+    return options
+
+
+def sparse_products_response(products: list, fields: List[str], **extra) -> JSONResponse:
+    """
+    Serialize products (ORM objects or dicts) with only the requested fields.
+
+    Returned as a JSONResponse so the full ProductsOut response model does not
+    force the omitted attributes to be loaded.
+    """
+    data = []
+
+    for product in products:
+        if isinstance(product, dict):
+            item = {field: product[field] for field in fields}
+        else:
+            item = {field: getattr(product, field) for field in fields}
+
+        if "category" in item and not isinstance(item["category"], dict):
+            item["category"] = {"id": item["category"].id, "name": item["category"].name}
+        data.append(item)
+
+    return JSONResponse(content=jsonable_encoder({"data": data, **extra}))
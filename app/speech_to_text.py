@@ -1,7 +1,8 @@
-from fastapi import File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
-from google.cloud import speech
+from fastapi import File, UploadFile, HTTPException, status
 import os
+import subprocess
+import tempfile
+import threading
 from dotenv import load_dotenv
 
 
@@ -10,15 +11,40 @@ dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
 load_dotenv(dotenv_path)
 
 google_cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-if not google_cred_path:
-    raise RuntimeError("GOOGLE_APPLICATION_CREDENTIALS is not set in .env")
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = google_cred_path
+if google_cred_path:
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = google_cred_path
 
+# Created on first use (or by warmup), so workers without voice search boot without credentials
+speech_client = None
+_client_lock = threading.Lock()
+
+
+def get_speech_client():
+    global speech_client
+
+    if not google_cred_path:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Voice search is not configured, GOOGLE_APPLICATION_CREDENTIALS is not set in .env"
+        )
+
+    if speech_client is None:
+        with _client_lock:
+            if speech_client is None:
+                from google.cloud import speech
+                speech_client = speech.SpeechClient()
+    return speech_client
+
+
+def warmup():
+    if google_cred_path:
+        get_speech_client()
 
-import subprocess
-import tempfile
 
 async def transcribe_audio(file: UploadFile = File(...)) -> str:
+    client = get_speech_client()
+    from google.cloud import speech
+
     contents = await file.read()
 
     # Write webm to temp file
@@ -50,7 +76,6 @@ async def transcribe_audio(file: UploadFile = File(...)) -> str:
     os.remove(webm_file_path)
     os.remove(wav_file_path)
 
-    client = speech.SpeechClient()
     audio = speech.RecognitionAudio(content=wav_bytes)
 
     config = speech.RecognitionConfig(
@@ -0,0 +1,88 @@
+"""
+Measure how long an API worker takes to start and what it loads.
+
+    python -m app.startup_check
+    python -m app.startup_check --runs 5 --warmup
+
+Starts fresh interpreters that import app.main and run the application
+startup (lifespan), and reports the median seconds of both, the peak
+resident memory and which model and cloud client libraries got imported.
+Without WARMUP_MODELS a worker that only serves the non-AI endpoints should
+import none of them. `--warmup` also loads every model and client, as
+WARMUP_MODELS=true or POST /admin/warmup would, for comparison.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+
+# Libraries only the AI endpoints need, none should be imported by a cold start
+HEAVY_MODULES = ["torch", "transformers", "sentence_transformers", "onnxruntime", "google.generativeai", "google.cloud.speech"]
+
+
+def measure(warmup: bool) -> dict:
+    """
+    Start the application in this interpreter, which must not have imported app.main yet.
+    """
+    started = time.perf_counter()
+    from app.main import app
+    from app.warmup import warmup_all
+    import_seconds = time.perf_counter() - started
+
+    async def start():
+        async with app.router.lifespan_context(app):
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    startup_seconds = asyncio.run(start())
+
+    warmup_seconds = None
+    if warmup:
+        started = time.perf_counter()
+        warmup_all()
+        warmup_seconds = time.perf_counter() - started
+
+    return {
+        "import_seconds": import_seconds,
+        "startup_seconds": startup_seconds,
+        "warmup_seconds": warmup_seconds,
+        # Kilobytes on Linux
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "heavy_modules": [name for name in HEAVY_MODULES if name in sys.modules]
+    }
+
+
+def check(runs: int, warmup: bool):
+    results = []
+    for _ in range(runs):
+        command = [sys.executable, "-m", "app.startup_check", "--child"] + (["--warmup"] if warmup else [])
+        child = subprocess.run(command, capture_output=True, text=True)
+        if child.returncode != 0:
+            print(child.stderr)
+            sys.exit(child.returncode)
+        results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+
+    print(f"{runs} cold starts")
+    for key, label in (("import_seconds", "Import app.main"), ("startup_seconds", "Application startup"), ("warmup_seconds", "Warmup")):
+        seconds = [result[key] for result in results if result[key] is not None]
+        if seconds:
+            print(f"{label}: median {np.median(seconds):.2f} s, max {np.max(seconds):.2f} s")
+    print(f"Peak memory: median {np.median([result['max_rss_mb'] for result in results]):.0f} MB")
+    print(f"Model and client libraries imported: {', '.join(results[0]['heavy_modules']) or 'none'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure API worker startup time and memory.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--warmup", action="store_true", help="Also load every model and client")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.warmup)))
+    else:
+        check(args.runs, args.warmup)
@@ -0,0 +1,221 @@
+import os
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from typing import Iterable, Optional, Tuple
+from app.database import SessionLocal
+from app.models import EMBEDDING_DIM, Product
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
+
+# Serve semantic search from an in-process copy of the product embeddings.
+# Postgres stays the source of truth; every worker loads its own copy at startup.
+VECTOR_INDEX_ENABLED = os.getenv('VECTOR_INDEX_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+VECTOR_INDEX_DTYPE = os.getenv('VECTOR_INDEX_DTYPE', 'float32')
+# Other workers' writes are only picked up by a full reload, every this many seconds (0 disables)
+VECTOR_INDEX_REFRESH_SECONDS = int(os.getenv('VECTOR_INDEX_REFRESH_SECONDS', '0'))
+
+# Rows scored per matrix product, bounds the float32 copy made of a float16 matrix
+SEARCH_CHUNK_SIZE = 65536
+# Default memory for the batch x products scores of all_neighbours
+ALL_NEIGHBOURS_MEMORY_BYTES = 256 * 2 ** 20
+
+
+def normalize(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector, axis=-1, keepdims=True)
+    return vector / np.where(norm == 0, 1, norm)
+
+
+class VectorIndex:
+    """
+    Contiguous matrix of normalized product embeddings plus the matching product ids.
+
+    Cosine similarity is a plain dot product on normalized rows, so a search
+    is one matrix-vector product (matrix-matrix for a batch of queries)
+    followed by a partial sort. Rows live in a growable buffer; deletes move
+    the last row into the hole, so the live rows always stay contiguous.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, dtype: str = "float32"):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._reset(capacity=1024)
+
+    def _reset(self, capacity: int):
+        self._matrix = np.zeros((capacity, self.dim), dtype=self.dtype)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._positions = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def build(self, rows: Iterable[Tuple[int, object]]):
+        """
+        Replace the whole index with `(product_id, embedding)` rows.
+        """
+        ids, vectors = [], []
+        for product_id, embedding in rows:
+            ids.append(product_id)
+            vectors.append(embedding)
+
+        matrix = normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)).astype(self.dtype)
+
+        with self._lock:
+            self._reset(capacity=max(1024, len(ids) * 2))
+            self._matrix[:len(ids)] = matrix
+            self._ids[:len(ids)] = ids
+            self._positions = {product_id: row for row, product_id in enumerate(ids)}
+            self._size = len(ids)
+
+    def upsert(self, product_id: int, embedding):
+        vector = normalize(embedding).astype(self.dtype)
+
+        with self._lock:
+            row = self._positions.get(product_id)
+            if row is None:
+                if self._size == len(self._ids):
+                    self._grow()
+                row = self._size
+                self._positions[product_id] = row
+                self._ids[row] = product_id
+                self._size += 1
+            self._matrix[row] = vector
+
+    def remove(self, product_id: int):
+        with self._lock:
+            row = self._positions.pop(product_id, None)
+            if row is None:
+                return
+
+            last = self._size - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = self._ids[last]
+                self._positions[int(self._ids[row])] = row
+            self._size = last
+
+    def _grow(self):
+        capacity = len(self._ids) * 2
+        matrix = np.zeros((capacity, self.dim), dtype=self.dtype)
+        ids = np.zeros(capacity, dtype=np.int64)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids = matrix, ids
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarity of every indexed product to each query, shape (queries, products).
+        """
+        queries = normalize(queries).reshape(-1, self.dim)
+        scores = np.empty((len(queries), self._size), dtype=np.float32)
+
+        for start in range(0, self._size, SEARCH_CHUNK_SIZE):
+            chunk = self._matrix[start:start + SEARCH_CHUNK_SIZE][:self._size - start]
+            scores[:, start:start + len(chunk)] = queries @ chunk.astype(np.float32, copy=False).T
+        return scores
+
+    def search(self, query, k: int, exclude_ids: Optional[set] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top `k` products by cosine similarity to `query`.
+
+        Returns:
+            Tuple: Product ids and similarities, most similar first.
+        """
+        ids, scores = self.search_batch(np.asarray(query)[None, :], k, exclude_ids)
+        return ids[0], scores[0]
+
+    def search_batch(self, queries, k: int, exclude_ids: Optional[set] = None) -> Tuple[list, list]:
+        with self._lock:
+            if self._size == 0:
+                return [np.empty(0, dtype=np.int64)] * len(queries), [np.empty(0, dtype=np.float32)] * len(queries)
+
+            scores = self.scores(np.asarray(queries, dtype=np.float32))
+            ids = self._ids[:self._size].copy()
+
+        if exclude_ids:
+            scores[:, np.isin(ids, list(exclude_ids))] = -np.inf
+
+        return top_k(scores, ids, k)
+
+    def all_neighbours(self, k: int, batch_size: int = 1024, memory_bytes: int = ALL_NEIGHBOURS_MEMORY_BYTES):
+        """
+        Yield `(product_ids, neighbour_ids, similarities)` batches covering every indexed product.
+
+        Each batch of rows is scored against the whole index with one matrix
+        product; a product is never its own neighbour. Batches hold at most
+        `batch_size` rows and fewer on a large index, so the dense float32
+        scores plus the negated copy and int64 positions of the partial sort
+        (16 bytes per product pair) fit in `memory_bytes`.
+        """
+        start = 0
+        while True:
+            with self._lock:
+                if start >= self._size:
+                    return
+                batch_size = max(1, min(batch_size, memory_bytes // (16 * self._size)))
+                queries = self._matrix[start:min(start + batch_size, self._size)].astype(np.float32)
+                ids = self._ids[:self._size].copy()
+                scores = self.scores(queries)
+
+            rows = np.arange(len(queries))
+            scores[rows, start + rows] = -np.inf
+
+            neighbour_ids, similarities = top_k(scores, ids, k)
+            yield ids[start:start + len(queries)], neighbour_ids, similarities
+            start += len(queries)
+
+
+def top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> Tuple[list, list]:
+    """
+    Ids and scores of the `k` best columns of every row of `scores`, best first, skipping -inf.
+    """
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    valid = np.isfinite(top_scores)
+    return [ids[row][mask] for row, mask in zip(top, valid)], [row[mask] for row, mask in zip(top_scores, valid)]
+
+
+vector_index = VectorIndex(dtype=VECTOR_INDEX_DTYPE)
+
+
+def load_vector_index(batch_size: int = 10000):
+    """
+    Build the index from Postgres, streaming embeddings in batches.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(Product.id, Product.embedding).\
+            yield_per(batch_size)
+        vector_index.build((row.id, row.embedding) for row in rows)
+    finally:
+        db.close()
+
+
+def refresh_loop(stop: threading.Event):
+    while not stop.wait(VECTOR_INDEX_REFRESH_SECONDS):
+        # A failed reload keeps serving the current copy and is retried at the next tick
+        try:
+            load_vector_index()
+        except Exception as e:
+            vector_index.last_error = f"{type(e).__name__}: {e}"
+            print(f"Vector index reload failed: {vector_index.last_error}")
+
+
+def index_product(product_id: int, embedding):
+    if VECTOR_INDEX_ENABLED:
+        vector_index.upsert(product_id, embedding)
+
+
+def unindex_product(product_id: int):
+    if VECTOR_INDEX_ENABLED:
+        vector_index.remove(product_id)
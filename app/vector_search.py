@@ -0,0 +1,492 @@
+import os
+import hashlib
+import json
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+from app.pagination import encode_cursor, decode_cursor
+from app.search import SEARCH_CONFIG, escape_like
+from app.search_cache import normalize_query
+from app.models import EMBEDDING_DIM, EMBEDDING_PCA_DIM, EMBEDDING_STORAGE
+from app.reduction import get_projection, project
+from app.vector_index import VECTOR_INDEX_ENABLED, vector_index
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
+
+# Size of the HNSW candidate list per search. Higher values raise recall and latency.
+HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', '40'))
+# Filtered searches: with an iterative scan (pgvector >= 0.8) HNSW keeps visiting
+# candidates until enough of them pass the filter, instead of returning fewer
+# than `limit` rows. "relaxed_order", "strict_order", or "off" for older pgvector.
+HNSW_ITERATIVE_SCAN = os.getenv('HNSW_ITERATIVE_SCAN', 'relaxed_order')
+# Upper bound pgvector accepts for hnsw.ef_search
+HNSW_MAX_EF_SEARCH = 1000
+
+# Quantized EMBEDDING_STORAGE: the index returns this many times the requested
+# rows, which are then re-ranked by the exact float32 distance
+EMBEDDING_RERANK_FACTOR = int(os.getenv('EMBEDDING_RERANK_FACTOR', '4'))
+# Full precision storage: extra rows of the index walk, so products tied on
+# distance at the end of a page are still ordered by id
+VECTOR_TIE_MARGIN = 10
+
+EXACT_DISTANCE = "products.embedding <=> CAST(:embedding AS vector)"
+# Distance expressions matching the HNSW index of each EMBEDDING_STORAGE (app.models)
+INDEX_DISTANCES = {
+    "vector": EXACT_DISTANCE,
+    "halfvec": f"CAST(products.embedding AS halfvec({EMBEDDING_DIM})) <=> CAST(:embedding AS halfvec({EMBEDDING_DIM}))",
+    "binary": f"CAST(binary_quantize(products.embedding) AS bit({EMBEDDING_DIM})) <~> binary_quantize(CAST(:embedding AS vector))",
+    "pca": f"CAST(products.embedding_reduced AS vector({EMBEDDING_PCA_DIM})) <=> CAST(:reduced_embedding AS vector({EMBEDDING_PCA_DIM}))"
+}
+
+# Keyword arguments of product_filters, as sent in TextSearchRequest
+SEARCH_FILTERS = {"category_id", "brand", "min_price", "max_price", "in_stock", "is_published"}
+
+PRODUCT_COLUMNS = """
+    products.id,
+    products.title,
+    products.description,
+    products.price,
+    products.discount_percentage,
+    products.rating,
+    products.stock,
+    products.brand,
+    products.thumbnail,
+    products.images,
+    products.is_published,
+    products.created_at,
+    products.category_id
+"""
+
+
+def to_vector_literal(embedding) -> str:
+    return "[" + ",".join(map(str, embedding)) + "]"
+
+
+def embedding_params(db: Session, query_embedding, storage: str = EMBEDDING_STORAGE) -> dict:
+    """
+    Bind parameters of the query vector for `nearest_sql`.
+
+    Raises:
+        HTTPException: 503 if the storage is pca and no projection was activated yet.
+    """
+    params = {"embedding": to_vector_literal(query_embedding)}
+
+    if storage == "pca":
+        projection = get_projection(db)
+        if projection is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="No embedding projection fitted, run python -m app.reduction fit!"
+            )
+        params["reduced_embedding"] = to_vector_literal(project(projection, query_embedding)[0])
+        # Vectors of different projection versions are not comparable, see nearest_sql
+        params["projection_version"] = projection.version
+    return params
+
+
+def rerank_limit(limit: int, storage: str = EMBEDDING_STORAGE) -> int:
+    return limit + VECTOR_TIE_MARGIN if storage == "vector" else limit * EMBEDDING_RERANK_FACTOR
+
+
+def nearest_sql(columns: str, condition: str, limit: str, storage: str = EMBEDDING_STORAGE) -> str:
+    """
+    SQL selecting `columns` and the exact `distance` of the `limit` nearest products passing `condition`.
+
+    The inner query orders by the bare distance expression of the storage's
+    index, which is what lets Postgres walk the HNSW index instead of sorting
+    the whole table; any second sort key would turn the walk into a full
+    sort. It returns `:rerank_limit` candidates, re-ranked here by the exact
+    distance on the float32 column and then by id. With pca storage only
+    products projected with the query's projection version are candidates.
+    """
+    if storage == "pca":
+        condition = f"({condition}) AND products.embedding_reduced_version = :projection_version"
+
+    return f"""
+            SELECT {columns}, {EXACT_DISTANCE} AS distance
+            FROM (
+                SELECT products.*
+                FROM products
+                WHERE {condition}
+                ORDER BY {INDEX_DISTANCES[storage]}
+                LIMIT :rerank_limit
+            ) AS products
+            ORDER BY distance, id
+            LIMIT {limit}
+        """
+
+
+def set_search_params(db: Session, limit: int, ef_search: Optional[int] = None, filtered: bool = False, storage: str = EMBEDDING_STORAGE):
+    """
+    Apply the ANN recall knobs to the current transaction only.
+
+    HNSW never returns more than `ef_search` rows, so it is raised to `limit` when needed,
+    up to HNSW_MAX_EF_SEARCH. Filtered searches, and every pca search since it
+    filters on the projection version, also turn on iterative scans, see HNSW_ITERATIVE_SCAN.
+    """
+    ef_search = min(max(ef_search or HNSW_EF_SEARCH, limit), HNSW_MAX_EF_SEARCH)
+    db.execute(text("SELECT set_config('hnsw.ef_search', :ef_search, true)"), {"ef_search": str(ef_search)})
+
+    if (filtered or storage == "pca") and HNSW_ITERATIVE_SCAN != "off":
+        db.execute(text("SELECT set_config('hnsw.iterative_scan', :mode, true)"), {"mode": HNSW_ITERATIVE_SCAN})
+
+
+def product_filters(
+    category_id: Optional[int] = None,
+    brand: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+    is_published: Optional[bool] = None
+) -> Tuple[str, dict]:
+    """
+    Build the SQL condition on `products` for the given search filters, None means no filter.
+
+    The condition goes into the WHERE clause of the same query that orders by
+    distance, so Postgres still walks the HNSW index and checks the filter on
+    every candidate it visits.
+
+    Returns:
+        Tuple: The condition ("TRUE" without filters) and its bind parameters.
+    """
+    conditions, params = [], {}
+
+    if category_id is not None:
+        conditions.append("products.category_id = :category_id")
+        params["category_id"] = category_id
+    if brand is not None:
+        conditions.append("lower(products.brand) = lower(:brand)")
+        params["brand"] = brand
+    if min_price is not None:
+        conditions.append("products.price >= :min_price")
+        params["min_price"] = min_price
+    if max_price is not None:
+        conditions.append("products.price <= :max_price")
+        params["max_price"] = max_price
+    if in_stock is not None:
+        conditions.append("products.stock > 0" if in_stock else "products.stock <= 0")
+    if is_published is not None:
+        conditions.append("products.is_published = :is_published")
+        params["is_published"] = is_published
+
+    return " AND ".join(conditions) or "TRUE", params
+
+
+def row_to_product(row) -> dict:
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "description": row["description"],
+        "price": row["price"],
+        "discount_percentage": row["discount_percentage"],
+        "rating": row["rating"],
+        "stock": row["stock"],
+        "brand": row["brand"],
+        "thumbnail": row["thumbnail"],
+        "images": row["images"],
+        "is_published": row["is_published"],
+        "created_at": row["created_at"],
+        "category": {
+            "id": row["category_id"],
+            "name": row["category_name"]
+        }
+    }
+
+
+def search_key(search: str, filters: dict) -> str:
+    payload = json.dumps([normalize_query(search), filters], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def encode_search_cursor(search: str, filters: dict, refined_query: str, last_score: dict, returned: int) -> str:
+    """
+    Cursor continuing a semantic search after the last returned product.
+
+    The refined query travels with the cursor, so later pages embed the same
+    query as the first one even if Gemini would refine it differently now.
+
+    Args:
+        search (str): Raw user query, the cursor is only valid for the same query and filters.
+        filters (dict): product_filters keyword arguments of the search.
+        refined_query (str): Query the first page was embedded from.
+        last_score (dict): Score of the last returned product.
+        returned (int): Number of products returned so far, over all pages.
+
+    Returns:
+        str: Opaque cursor to be handed back by the client as `cursor`.
+    """
+    return encode_cursor({
+        "q": search_key(search, filters),
+        "r": refined_query,
+        "d": last_score["distance"],
+        "id": last_score["product_id"],
+        "n": returned
+    })
+
+
+def decode_search_cursor(search: str, filters: dict, cursor: str) -> Tuple[Tuple[float, int], int, str]:
+    """
+    Decode a cursor produced by `encode_search_cursor`.
+
+    Returns:
+        Tuple: The `(distance, product_id)` to continue after, the number of products already returned and the refined query.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed or belongs to another query.
+    """
+    payload = decode_cursor(cursor)
+
+    try:
+        if payload["q"] != search_key(search, filters) or not isinstance(payload["r"], str):
+            raise ValueError
+        return (float(payload["d"]), int(payload["id"])), int(payload["n"]), payload["r"]
+    except (KeyError, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor!"
+        )
+
+
+def get_products_by_ids(db: Session, product_ids: List[int], filters: Optional[dict] = None) -> List[dict]:
+    """
+    Fetch products as ProductBase shaped dicts, in the order of `product_ids`.
+
+    Products that do not pass `filters` (product_filters keyword arguments) are left out.
+    """
+    if not product_ids:
+        return []
+
+    condition, params = product_filters(**(filters or {}))
+
+    sql = text(f"""
+        SELECT
+            {PRODUCT_COLUMNS},
+            categories.name AS category_name
+        FROM products
+        JOIN categories ON products.category_id = categories.id
+        WHERE products.id = ANY(:ids)
+            AND {condition}
+    """)
+    rows = {row["id"]: row for row in db.execute(sql, {"ids": list(product_ids), **params}).mappings().all()}
+
+    return [row_to_product(rows[product_id]) for product_id in product_ids if product_id in rows]
+
+
+def semantic_search(
+    db: Session,
+    query_embedding,
+    limit: int,
+    ef_search: Optional[int] = None,
+    filters: Optional[dict] = None,
+    after: Optional[Tuple[float, int]] = None,
+    offset: int = 0
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Return the `limit` products closest to `query_embedding` by cosine distance.
+
+    With VECTOR_INDEX_ENABLED the neighbours come from the in-process index and
+    Postgres only fetches the rows by primary key. Otherwise they are selected
+    by the HNSW walk in `nearest_sql` and categories are joined afterwards.
+    Filters are checked in the same subquery, on the candidates the index
+    scan produces.
+
+    Later pages continue after the `(distance, id)` of the previous page's last
+    product, so they walk the index from where the previous page stopped
+    instead of re-sorting a larger prefix. Products with exactly the same
+    distance are ordered by id.
+
+    Args:
+        db (Session): Database session.
+        query_embedding: Query vector, 384 floats.
+        limit (int): Number of products to return.
+        ef_search (int): Optional per-request override of HNSW_EF_SEARCH.
+        filters (dict): Optional product_filters keyword arguments.
+        after (Tuple): Optional `(distance, product_id)` of the last product of the previous page.
+        offset (int): Number of products returned by the previous pages.
+
+    Returns:
+        Tuple: Product dicts shaped like ProductBase, nearest first, and their scores.
+    """
+    filters = {key: value for key, value in (filters or {}).items() if value is not None}
+
+    if VECTOR_INDEX_ENABLED:
+        # Over-fetch when filtering and widen until enough neighbours pass the filter
+        k = (offset + limit) * (4 if filters else 1)
+        while True:
+            product_ids, similarities = vector_index.search(query_embedding, k)
+            distances = {int(product_id): 1 - float(similarity) for product_id, similarity in zip(product_ids, similarities)}
+            candidate_ids = sorted(
+                (product_id for product_id, distance in distances.items() if after is None or (distance, product_id) > after),
+                key=lambda product_id: (distances[product_id], product_id)
+            )
+            products = get_products_by_ids(db, candidate_ids, filters)[:limit]
+            if len(products) == limit or len(product_ids) < k:
+                break
+            k *= 4
+
+        scores = [
+            semantic_score(product["id"], rank, distances[product["id"]])
+            for rank, product in enumerate(products, start=offset + 1)
+        ]
+        return products, scores
+
+    condition, params = product_filters(**filters)
+    if after is not None:
+        condition += f"""
+            AND ({EXACT_DISTANCE} > :after_distance
+                OR ({EXACT_DISTANCE} = :after_distance AND products.id > :after_id))"""
+        params.update(after_distance=after[0], after_id=after[1])
+
+    # Iterative scans keep walking past the earlier pages' candidates on their own. Without them
+    # HNSW only yields ef_search candidates, which must cover every page so far (up to HNSW_MAX_EF_SEARCH)
+    ef_limit = rerank_limit(limit) if HNSW_ITERATIVE_SCAN != "off" else offset + rerank_limit(limit)
+    set_search_params(db, limit=ef_limit, ef_search=ef_search, filtered=bool(filters) or after is not None)
+
+    sql = text(f"""
+        SELECT
+            nearest.*,
+            categories.name AS category_name
+        FROM ({nearest_sql(PRODUCT_COLUMNS, condition, ":limit")}) AS nearest
+        JOIN categories ON nearest.category_id = categories.id
+        ORDER BY nearest.distance, nearest.id
+    """)
+    result = db.execute(sql, {
+        **embedding_params(db, query_embedding),
+        "limit": limit,
+        "rerank_limit": rerank_limit(limit),
+        **params
+    }).mappings().all()
+
+    products = [row_to_product(row) for row in result]
+    scores = [semantic_score(row["id"], rank, row["distance"]) for rank, row in enumerate(result, start=offset + 1)]
+    return products, scores
+
+
+def semantic_score(product_id: int, rank: int, distance: float) -> dict:
+    return {
+        "product_id": product_id,
+        "score": 1 - distance,
+        "semantic_rank": rank,
+        "distance": distance
+    }
+
+
+def hybrid_search(
+    db: Session,
+    search: str,
+    query_embedding,
+    limit: int,
+    candidates: int = 100,
+    lexical_weight: float = 1.0,
+    semantic_weight: float = 1.0,
+    rrf_k: int = 60,
+    ef_search: Optional[int] = None,
+    filters: Optional[dict] = None
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Fuse full-text and vector retrieval with weighted reciprocal rank fusion in one query.
+
+    Each side retrieves its top `candidates` through its own index (GIN for
+    the lexical side, HNSW for the semantic side). A product's fused score is
+    `semantic_weight / (rrf_k + semantic_rank) + lexical_weight / (rrf_k + lexical_rank)`,
+    where a side that did not retrieve the product contributes 0.
+
+    Args:
+        db (Session): Database session.
+        search (str): Raw user query, used for the lexical side so exact brand and model tokens survive.
+        query_embedding: Embedding of the refined query, used for the semantic side.
+        limit (int): Number of products to return.
+        candidates (int): Candidates retrieved by each side before fusion.
+        lexical_weight (float): Weight of the lexical ranking.
+        semantic_weight (float): Weight of the semantic ranking.
+        rrf_k (int): RRF damping constant, larger values flatten the rank differences.
+        ef_search (int): Optional per-request override of HNSW_EF_SEARCH.
+        filters (dict): Optional product_filters keyword arguments, applied to both sides.
+
+    Returns:
+        Tuple: Product dicts shaped like ProductBase, best first, and their per-side scores.
+    """
+    filters = {key: value for key, value in (filters or {}).items() if value is not None}
+    condition, params = product_filters(**filters)
+    set_search_params(db, limit=rerank_limit(candidates), ef_search=ef_search, filtered=bool(filters))
+
+    sql = text(f"""
+        WITH semantic AS (
+            SELECT
+                nearest.id,
+                row_number() OVER (ORDER BY nearest.distance) AS rank,
+                nearest.distance
+            FROM ({nearest_sql("products.id", condition, ":candidates")}) AS nearest
+        ),
+        lexical AS (
+            SELECT
+                matches.id,
+                row_number() OVER (ORDER BY matches.score DESC, matches.id) AS rank,
+                matches.score
+            FROM (
+                SELECT
+                    products.id,
+                    ts_rank_cd(products.search_vector, query) + similarity(products.title, :search) AS score
+                FROM products, websearch_to_tsquery('{SEARCH_CONFIG}', :search) AS query
+                WHERE ({condition})
+                    AND (products.search_vector @@ query OR products.title ILIKE :pattern ESCAPE '\\')
+                ORDER BY score DESC
+                LIMIT :candidates
+            ) AS matches
+        ),
+        fused AS (
+            SELECT
+                COALESCE(semantic.id, lexical.id) AS id,
+                COALESCE(:semantic_weight / (:rrf_k + semantic.rank), 0)
+                    + COALESCE(:lexical_weight / (:rrf_k + lexical.rank), 0) AS score,
+                semantic.rank AS semantic_rank,
+                semantic.distance,
+                lexical.rank AS lexical_rank,
+                lexical.score AS lexical_score
+            FROM semantic
+            FULL OUTER JOIN lexical ON semantic.id = lexical.id
+            ORDER BY score DESC, id
+            LIMIT :limit
+        )
+        SELECT
+            {PRODUCT_COLUMNS},
+            categories.name AS category_name,
+            fused.score AS fused_score,
+            fused.semantic_rank,
+            fused.distance,
+            fused.lexical_rank,
+            fused.lexical_score
+        FROM fused
+        JOIN products ON fused.id = products.id
+        JOIN categories ON products.category_id = categories.id
+        ORDER BY fused.score DESC, products.id
+    """)
+    result = db.execute(sql, {
+        **embedding_params(db, query_embedding),
+        "search": search,
+        "pattern": f"%{escape_like(search)}%",
+        "candidates": candidates,
+        "rerank_limit": rerank_limit(candidates),
+        "limit": limit,
+        "semantic_weight": semantic_weight,
+        "lexical_weight": lexical_weight,
+        "rrf_k": rrf_k,
+        **params
+    }).mappings().all()
+
+    products = [row_to_product(row) for row in result]
+    scores = [
+        {
+            "product_id": row["id"],
+            "score": row["fused_score"],
+            "semantic_rank": row["semantic_rank"],
+            "distance": row["distance"],
+            "lexical_rank": row["lexical_rank"],
+            "lexical_score": row["lexical_score"]
+        }
+        for row in result
+    ]
+    return products, scores
@@ -0,0 +1,41 @@
+import os
+import time
+from dotenv import load_dotenv
+from app import gemini, huggingface, speech_to_text
+from app.model_client import MODEL_SERVER_SOCKET, get_model_client
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(dotenv_path)
+
+# Load models and clients during startup instead of on the first request.
+# Leave off for workers that only serve the non-AI endpoints.
+WARMUP_MODELS = os.getenv('WARMUP_MODELS', 'false').lower() in ('1', 'true', 'yes')
+
+if MODEL_SERVER_SOCKET:
+    # Models live in the model server, only check that it answers
+    COMPONENTS = {"model_server": lambda: get_model_client().call("stats", None)}
+else:
+    # The same entry point the model server warms up with
+    COMPONENTS = {"huggingface_models": huggingface.warmup}
+
+COMPONENTS.update({
+    "gemini": gemini.warmup,
+    "speech_to_text": speech_to_text.warmup
+})
+
+
+def warmup_all() -> dict:
+    """
+    Load every model and client.
+
+    Returns:
+        dict: Seconds spent per component, near zero for already loaded ones.
+    """
+    timings = {}
+
+    for name, load in COMPONENTS.items():
+        started = time.perf_counter()
+        load()
+        timings[name] = time.perf_counter() - started
+
+    return timings